@@ -1,27 +1,47 @@
 from fastapi import FastAPI, UploadFile, File, Body, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from openai import OpenAI
 
-import tempfile
-import os
-import difflib
+import asyncio
 import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
 
 from core.agent import run_agent, run_analyze_agent
-from core.feature_structure import build_feature_structure
-from core.update_engine import apply_update_plan, read_all_features_map
+from core.batch_analyze import analyze_batch
+from core.suite_index import get_suite_index, SKIPPED_DIR_PREFIXES
+from core.update_engine import apply_update_plan
 from core.initial_generation_engine import apply_initial_generation
-from core.llm import call_llm
-from core.sync_prompt_builder import build_sync_prompt
+from core.llm import reset_clients
+from core.llm_cache import get_llm_cache, llm_cache_stats
+from core.rate_limiter import get_rate_limiter
+from core.retry_policy import get_retry_stats
+from core.sync_service import run_sync
+from core.single_flight import get_single_flight, flight_key
 from core.test_reader import read_existing_tests
-from core.schemas_tests import UpdatePlan
-from core.schemas_initial import InitialGeneration
-from core.document_reader import extract_document
+from core.uploads import spool_upload, extract_upload, get_text_cache, UploadTooLargeError
+from core.jobs import (
+    get_job_queue, list_folder_documents, JobNotFoundError, JobStateError,
+    SYNC, ANALYZE, SUCCEEDED, FAILED
+)
+from core.pdf_extraction import PageRangeError, pdf_extraction_stats
+from core.embedding_cache import embedding_cache_stats
+from core.history import get_history_store
+from core.plan_store import commit_plan, PlanNotFoundError, PlanConflictError
 from core import config
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume jobs a previous run left queued
+    get_job_queue().start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # =========================================================
@@ -29,8 +49,38 @@ app = FastAPI()
 # =========================================================
 
 @app.post("/analyze")
-def analyze_story(story: dict):
-    return run_analyze_agent(story)
+async def analyze_story(story: dict, no_cache: bool = Query(False)):
+    return await get_single_flight().do(
+        flight_key(f"analyze:{no_cache}", story),
+        lambda: run_analyze_agent(story, use_cache=not no_cache)
+    )
+
+
+@app.post("/analyze/batch")
+async def analyze_stories(payload: dict = Body(...), no_cache: bool = Query(False)):
+    """
+    {"stories": [...]} -> NDJSON stream: one {"index", "result"|"error"}
+    line per story as it completes, then a {"summary"} line.
+    """
+    stories = payload.get("stories")
+
+    if not isinstance(stories, list) or not stories:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "stories must be a non-empty list"}
+        )
+
+    if len(stories) > config.ANALYZE_BATCH_MAX_STORIES:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"At most {config.ANALYZE_BATCH_MAX_STORIES} stories per batch"}
+        )
+
+    async def lines():
+        async for item in analyze_batch(stories, use_cache=not no_cache):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 # =========================================================
@@ -41,8 +91,16 @@ def analyze_story(story: dict):
 async def sync_tests(
     file: UploadFile = File(None),
     text_input: str = None,
-    dry_run: bool = Query(False)
+    dry_run: bool = Query(False),
+    no_cache: bool = Query(False),
+    sharded: Optional[bool] = Query(None),
+    document_id: Optional[str] = Query(None),
+    full_document: bool = Query(False),
+    pages: Optional[str] = Query(None)
 ):
+    upload = None
+    leading = False
+
     try:
 
         # ======================================================
@@ -55,191 +113,310 @@ async def sync_tests(
             )
 
         # ======================================================
-        # 2️⃣ Extract new document
+        # 2️⃣ Identify the request
         # ======================================================
         if file:
-            ext = os.path.splitext(file.filename)[1].lower()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-                content = await file.read()
-                tmp.write(content)
-                tmp_path = tmp.name
-            new_document = extract_document(tmp_path)
+            # Chunked copy to a spool file, hashed on the way
+            upload = await spool_upload(file)
+            document = f"{upload.ext}\0{upload.sha256}"
+            # Re-uploads of the same file are diffed against its last sync
+            document_id = document_id or file.filename
         else:
-            new_document = text_input
+            document = text_input
+
+        base_dir = config.BASE_FEATURES_DIR
+        # The version stats every feature file: off the event loop
+        suite_version = await asyncio.to_thread(get_suite_index(base_dir).version)
+        key = flight_key(
+            f"sync-tests:{os.path.abspath(base_dir)}:{no_cache}:{sharded}:{document_id}:{full_document}:{pages}",
+            document,
+            suite_version
+        )
 
         # ======================================================
-        # 3️⃣ Read current suite
+        # 3️⃣ Extract and sync, once per identical request
         # ======================================================
-        current_files_raw = read_all_features_map(config.BASE_FEATURES_DIR)
-
-        current_files = {
-            os.path.abspath(path): content
-            for path, content in current_files_raw.items()
-        }
+        async def compute():
+            if file:
+                try:
+                    # Extraction is CPU-bound: keep it off the event loop
+                    new_document = await asyncio.to_thread(extract_upload, upload, pages)
+                finally:
+                    # The spool file belongs to the flight, which outlives
+                    # a leading request that disconnects
+                    upload.discard()
+            else:
+                new_document = text_input
 
-        existing_structure = build_feature_structure(config.BASE_FEATURES_DIR)
+            return await run_sync(
+                new_document, base_dir, use_cache=not no_cache, sharded=sharded,
+                document_id=document_id, full_document=full_document
+            )
 
-        # ======================================================
-        # 4️⃣ Build prompt
-        # ======================================================
-        prompt = build_sync_prompt(
-            current_tests="\n".join(current_files.values()),
-            existing_structure=existing_structure,
-            new_document=new_document
-        )
+        def lead():
+            # Only called when this request starts the flight
+            nonlocal leading
+            leading = True
+            return compute()
 
-        # ======================================================
-        # 5️⃣ Call LLM (RAW)
-        # ======================================================
-        raw_response = call_llm(prompt)
+        return await get_single_flight().do(key, lead)
 
-        print("LLM RAW RESPONSE:", raw_response)
+    except UploadTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
 
-        # --------------------------------------------------
-        # NORMALIZE RESPONSE TYPE
-        # --------------------------------------------------
+    except PageRangeError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
 
-        if isinstance(raw_response, dict):
-            parsed = raw_response
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
 
-        elif isinstance(raw_response, str):
+    finally:
+        # Uploads that joined another request's flight were never read
+        if upload is not None and not leading:
+            upload.discard()
 
-            cleaned = raw_response.strip()
 
-            # Remove code fences
-            if cleaned.startswith("```"):
-                cleaned = cleaned.split("```")[1]
+# =========================================================
+# APPLY PROPOSED
+# =========================================================
 
-            # Extract JSON safely
-            first = cleaned.find("{")
-            last = cleaned.rfind("}")
+@app.post("/apply-proposed")
+async def apply_proposed(payload: dict):
+    try:
 
-            if first == -1 or last == -1:
+        # Precomputed dry run: commit it if the touched files are unchanged
+        if payload.get("plan_id"):
+            try:
+                commit_plan(payload["plan_id"])
+            except PlanNotFoundError as e:
                 return JSONResponse(
-                    status_code=500,
-                    content={"error": "No JSON found in LLM response"}
+                    status_code=410,
+                    content={"error": str(e)}
                 )
-
-            cleaned = cleaned[first:last+1]
-
-            try:
-                parsed = json.loads(cleaned)
-            except Exception as e:
-                print("JSON PARSE ERROR:", str(e))
+            except PlanConflictError as e:
                 return JSONResponse(
-                    status_code=500,
-                    content={"error": "Malformed JSON from LLM"}
+                    status_code=409,
+                    content={
+                        "error": "Test suite changed since the dry run. Run it again.",
+                        "conflicts": [
+                            os.path.relpath(path, config.BASE_FEATURES_DIR)
+                            for path in e.conflicts
+                        ]
+                    }
                 )
 
+            return {"status": "ok"}
+
+        if "features" in payload:
+            apply_initial_generation(payload, simulate=False, base_dir=config.BASE_FEATURES_DIR)
+
+        elif "changes" in payload:
+            apply_update_plan(payload, simulate=False, base_dir=config.BASE_FEATURES_DIR)
+
         else:
             return JSONResponse(
-                status_code=500,
-                content={"error": f"Unsupported LLM response type: {type(raw_response)}"}
+                status_code=400,
+                content={"error": "Invalid payload format"}
             )
 
-        # ======================================================
-        # 6️⃣ Detect response type
-        # ======================================================
+        return {"status": "ok"}
 
-        if "features" in parsed:
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
 
-            validated = InitialGeneration(**parsed)
 
-            simulated_files_raw = apply_initial_generation(
-                validated.model_dump(),
-                simulate=True
-            )
+# =========================================================
+# BACKGROUND JOBS
+# =========================================================
 
-            result_payload = validated.model_dump()
+def _job_not_found(e: Exception):
+    return JSONResponse(
+        status_code=404,
+        content={"error": str(e)}
+    )
 
-        elif "changes" in parsed:
 
-            validated = UpdatePlan(**parsed)
+@app.post("/jobs/sync")
+async def submit_sync_job(
+    file: UploadFile = File(None),
+    text_input: str = None,
+    no_cache: bool = Query(False),
+    sharded: Optional[bool] = Query(None),
+    document_id: Optional[str] = Query(None),
+    full_document: bool = Query(False),
+    pages: Optional[str] = Query(None)
+):
+    if not file and not text_input:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Provide file or text_input."}
+        )
 
-            simulated_files_raw = apply_update_plan(
-                validated.model_dump(),
-                simulate=True
-            )
+    queue = get_job_queue()
 
-            result_payload = validated.model_dump()
+    params = {
+        "base_dir": config.BASE_FEATURES_DIR,
+        "no_cache": no_cache,
+        "sharded": sharded,
+        "document_id": document_id,
+        "full_document": full_document,
+        "pages": pages
+    }
 
-        else:
+    if file:
+        try:
+            upload = await spool_upload(file, directory=queue.uploads_dir)
+        except UploadTooLargeError as e:
             return JSONResponse(
-                status_code=500,
-                content={"error": "Unknown response format from LLM"}
+                status_code=413,
+                content={"error": str(e)}
             )
 
-        simulated_files = {
-            os.path.abspath(path): content
-            for path, content in simulated_files_raw.items()
-        }
+        params["upload"] = vars(upload)
+        params["document_id"] = document_id or file.filename
+        label = file.filename
+    else:
+        params["text"] = text_input
+        label = document_id
 
-        # ======================================================
-        # 7️⃣ Build diff
-        # ======================================================
-        diff_by_file = {}
+    job = await queue.submit(SYNC, params, label=label)
 
-        for path, new_content in simulated_files.items():
+    return JSONResponse(status_code=202, content=job)
 
-            old_content = current_files.get(path)
 
-            if old_content is None:
-                diff = list(difflib.unified_diff(
-                    [],
-                    new_content.splitlines(),
-                    lineterm=""
-                ))
-            else:
-                diff = list(difflib.unified_diff(
-                    old_content.splitlines(),
-                    new_content.splitlines(),
-                    lineterm=""
-                ))
+@app.post("/jobs/analyze")
+async def submit_analyze_job(story: dict, no_cache: bool = Query(False)):
+    job = await get_job_queue().submit(ANALYZE, {"story": story, "no_cache": no_cache})
 
-            if diff:
-                file_key = os.path.relpath(path, config.BASE_FEATURES_DIR)
-                diff_by_file[file_key] = diff
+    return JSONResponse(status_code=202, content=job)
 
-        print("==== DIFF BY FILE ====")
-        print(diff_by_file)
 
-        return {
-            "result": result_payload,
-            "diff": diff_by_file
-        }
+@app.post("/jobs/batch")
+async def submit_batch_jobs(payload: dict = Body(...)):
+    """
+    One sync job per document in a folder:
+    {"folder": "...", "recursive": false, "pages": null, "no_cache": false, "sharded": null}
+    """
+    folder = payload.get("folder")
 
-    except Exception as e:
+    if not folder:
         return JSONResponse(
-            status_code=500,
+            status_code=400,
+            content={"error": "folder is required"}
+        )
+
+    try:
+        paths = list_folder_documents(folder, bool(payload.get("recursive")))
+    except FileNotFoundError as e:
+        return JSONResponse(
+            status_code=404,
             content={"error": str(e)}
         )
 
+    queue = get_job_queue()
+    batch_id = uuid.uuid4().hex
+    jobs = []
+
+    for path in paths:
+        name = os.path.relpath(path, folder)
+
+        jobs.append(await queue.submit(
+            SYNC,
+            {
+                "file": os.path.abspath(path),
+                "base_dir": config.BASE_FEATURES_DIR,
+                "no_cache": bool(payload.get("no_cache")),
+                "sharded": payload.get("sharded"),
+                "document_id": name,
+                "pages": payload.get("pages")
+            },
+            batch_id=batch_id,
+            label=name
+        ))
+
+    return JSONResponse(
+        status_code=202,
+        content={"batch_id": batch_id, "jobs": jobs}
+    )
+
+
+@app.get("/jobs")
+def list_jobs(
+    batch_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    limit: int = Query(100)
+):
+    return get_job_queue().store.list(batch_id, status, limit)
 
-# =========================================================
-# APPLY PROPOSED
-# =========================================================
 
-@app.post("/apply-proposed")
-async def apply_proposed(payload: dict):
+@app.get("/jobs/batch/{batch_id}")
+def get_batch(batch_id: str):
+    store = get_job_queue().store
+    jobs = store.list(batch_id=batch_id, limit=10000)
+
+    if not jobs:
+        return _job_not_found(JobNotFoundError(f"Unknown batch: {batch_id}"))
+
+    return {
+        "batch_id": batch_id,
+        "counts": store.counts(batch_id),
+        "jobs": jobs
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
     try:
+        return get_job_queue().store.get(job_id)
+    except JobNotFoundError as e:
+        return _job_not_found(e)
 
-        if "features" in payload:
-            apply_initial_generation(payload, simulate=False)
 
-        elif "changes" in payload:
-            apply_update_plan(payload, simulate=False)
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    store = get_job_queue().store
 
-        else:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Invalid payload format"}
-            )
+    try:
+        job = store.get(job_id)
+    except JobNotFoundError as e:
+        return _job_not_found(e)
 
-        return {"status": "ok"}
+    if job["status"] == SUCCEEDED:
+        return store.result(job_id)
 
-    except Exception as e:
+    if job["status"] == FAILED:
         return JSONResponse(
             status_code=500,
+            content={"error": job["error"], "job": job}
+        )
+
+    return JSONResponse(
+        status_code=409,
+        content={"error": f"Job is {job['status']}", "job": job}
+    )
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    try:
+        return get_job_queue().cancel(job_id)
+    except JobNotFoundError as e:
+        return _job_not_found(e)
+    except JobStateError as e:
+        return JSONResponse(
+            status_code=409,
             content={"error": str(e)}
         )
 
@@ -257,9 +434,14 @@ def get_test_structure():
     if not os.path.exists(base):
         return structure
 
+    entries = get_suite_index(base).refresh()
+
     for screen in os.listdir(base):
 
-        screen_path = os.path.join(base, screen)
+        screen_path = os.path.abspath(os.path.join(base, screen))
+
+        if screen.startswith(SKIPPED_DIR_PREFIXES):
+            continue
 
         if os.path.isdir(screen_path):
 
@@ -269,13 +451,50 @@ def get_test_structure():
 
                 file_path = os.path.join(screen_path, file)
 
-                if file.endswith(".feature"):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        structure[screen][file] = f.read()
+                if file_path in entries:
+                    structure[screen][file] = entries[file_path].text
 
     return structure
 
 
+# =========================================================
+# SUITE HISTORY
+# =========================================================
+
+@app.get("/history")
+def list_history():
+    return {
+        "versions": get_history_store(config.BASE_FEATURES_DIR).versions()
+    }
+
+
+@app.post("/history/restore")
+def restore_history(payload: dict = Body(...)):
+
+    version = payload.get("version")
+
+    if not isinstance(version, int):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Integer version required"}
+        )
+
+    try:
+        entry = get_history_store(config.BASE_FEATURES_DIR).restore(version)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=404,
+            content={"error": str(e)}
+        )
+
+    return {"status": "restored", "version": entry}
+
+
+@app.post("/history/gc")
+def collect_history():
+    return get_history_store(config.BASE_FEATURES_DIR).gc()
+
+
 # =========================================================
 # SET FEATURES DIRECTORY
 # =========================================================
@@ -331,6 +550,7 @@ def set_api_key(payload: dict = Body(...)):
         )
 
     os.environ["OPENAI_API_KEY"] = api_key
+    reset_clients()
 
     return {"status": "API key stored successfully"}
 
@@ -351,10 +571,23 @@ def system_status():
 
     return {
         "api_configured": bool(os.environ.get("OPENAI_API_KEY")),
-        "features_directory": config.BASE_FEATURES_DIR
+        "features_directory": config.BASE_FEATURES_DIR,
+        "embedding_cache": embedding_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "single_flight": get_single_flight().stats(),
+        "rate_limiter": get_rate_limiter().stats(),
+        "llm_retries": get_retry_stats().stats(),
+        "pdf_extraction": pdf_extraction_stats(),
+        "extracted_text_cache": get_text_cache().stats(),
+        "jobs": get_job_queue().stats()
     }
 
 
+@app.post("/llm-cache/clear")
+def clear_llm_cache():
+    return {"removed": get_llm_cache().clear()}
+
+
 # =========================================================
 # SERVE UI
 # =========================================================
@@ -1,21 +1,22 @@
+from functools import partial
 from .prompt_builder import build_prompt, build_analyze_prompt
-from .llm import call_llm
+from .llm import acall_llm
 from .schemas import QAAnalysis
 from .retry import retry_with_correction
 
-def run_agent(story):
-    prompt = build_prompt(story)
-    return retry_with_correction(
-        call_fn=call_llm,
+async def run_agent(story, use_cache: bool = True):
+    prompt = await build_prompt(story)
+    return await retry_with_correction(
+        call_fn=partial(acall_llm, use_cache=use_cache),
         prompt=prompt,
-        schema_cls=QAAnalysis
+        response_model=QAAnalysis
     )
 
-def run_analyze_agent(story: dict):
+async def run_analyze_agent(story: dict, use_cache: bool = True):
     prompt = build_analyze_prompt(story)
 
-    return retry_with_correction(
+    return await retry_with_correction(
         prompt=prompt,
-        call_fn=call_llm,
+        call_fn=partial(acall_llm, use_cache=use_cache),
         response_model=QAAnalysis
     )
@@ -0,0 +1,70 @@
+import os
+import stat
+import tempfile
+
+
+DEFAULT_FILE_MODE = 0o644
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _target_mode(path: str) -> int:
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return DEFAULT_FILE_MODE & ~umask
+
+
+def write_files_atomic(files: dict):
+    """
+    Write {path: content} so every file is either fully old or fully new.
+
+    Each file goes to a temp file in its own directory; all temp files
+    are fsynced in one batch, renamed over their targets with os.replace
+    and finally the touched directories are fsynced once each.
+    """
+    if not files:
+        return
+
+    staged = []
+
+    try:
+        for path, content in files.items():
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory,
+                prefix=f".{os.path.basename(path)}.",
+                suffix=".tmp"
+            )
+            staged.append((tmp_path, path))
+
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+
+            os.chmod(tmp_path, _target_mode(path))
+
+        for tmp_path, _ in staged:
+            _fsync_path(tmp_path)
+
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+
+    except BaseException:
+        for tmp_path, _ in staged:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    if os.name == "posix":
+        for directory in {os.path.dirname(path) for _, path in staged}:
+            _fsync_path(directory)
@@ -0,0 +1,91 @@
+import json
+import asyncio
+import hashlib
+from core import config
+from core.agent import run_analyze_agent
+
+
+# ============================================================
+# Batch story analysis
+#
+# Identical stories are analyzed once. The distinct stories run
+# concurrently, at most ANALYZE_BATCH_CONCURRENCY at a time, and
+# every result is emitted as soon as it is ready, once per input
+# position it answers. A failing story yields an error item and
+# the rest of the batch goes on.
+# ============================================================
+
+
+def story_key(story) -> str:
+    return hashlib.sha256(
+        json.dumps(story, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def group_stories(stories: list) -> dict:
+    """
+    story key -> (story, [input indexes]), in first-seen order.
+    """
+    groups = {}
+
+    for index, story in enumerate(stories):
+        key = story_key(story)
+        if key in groups:
+            groups[key][1].append(index)
+        else:
+            groups[key] = (story, [index])
+
+    return groups
+
+
+async def analyze_batch(stories: list, use_cache: bool = True, concurrency: int = None):
+    """
+    Yield {"index", "result"} or {"index", "error"} per input story in
+    completion order, then {"summary": {...}}.
+    """
+    groups = group_stories(stories)
+    semaphore = asyncio.Semaphore(concurrency or config.ANALYZE_BATCH_CONCURRENCY)
+
+    async def analyze(story, indexes):
+        try:
+            if not isinstance(story, dict):
+                raise ValueError("A story must be a JSON object")
+
+            async with semaphore:
+                return indexes, await run_analyze_agent(story, use_cache=use_cache), None
+
+        except Exception as e:
+            return indexes, None, str(e) or type(e).__name__
+
+    tasks = [
+        asyncio.ensure_future(analyze(story, indexes))
+        for story, indexes in groups.values()
+    ]
+
+    succeeded = failed = 0
+
+    try:
+        for future in asyncio.as_completed(tasks):
+            indexes, result, error = await future
+
+            for index in indexes:
+                if error is None:
+                    succeeded += 1
+                    yield {"index": index, "result": result}
+                else:
+                    failed += 1
+                    yield {"index": index, "error": error}
+
+    finally:
+        # Stops the remaining analyses when the client goes away
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "summary": {
+            "stories": len(stories),
+            "distinct": len(groups),
+            "succeeded": succeeded,
+            "failed": failed
+        }
+    }
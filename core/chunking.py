@@ -0,0 +1,39 @@
+# Separators tried (in order) when looking for a natural chunk boundary
+BOUNDARIES = ("\n\n", "\n", ". ", " ")
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int):
+    """
+    Yield (start, end, chunk) for overlapping windows of text.
+
+    Offsets refer to the original text, so text[start:end] == chunk.
+    Windows prefer to end on a paragraph, line, sentence or word boundary.
+    """
+    n = len(text)
+    start = 0
+
+    while start < n:
+        end = min(start + chunk_size, n)
+
+        if end < n:
+            floor = start + chunk_size // 2
+            for sep in BOUNDARIES:
+                cut = text.rfind(sep, floor, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+
+        piece = text[start:end]
+        stripped = piece.strip()
+
+        if stripped:
+            lead = len(piece) - len(piece.lstrip())
+            yield start + lead, start + lead + len(stripped), stripped
+
+        if end >= n:
+            break
+
+        # Next window starts `overlap` characters back, on a word boundary
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
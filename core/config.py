@@ -16,3 +16,96 @@ BASE_FEATURES_DIR = os.environ.get(
     os.path.join(get_default_documents_path(), "generated_tests")
 )
 
+
+CACHE_DIR = os.environ.get(
+    "QA_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".qa_agent", "cache")
+)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("QA_EMBEDDING_CACHE_MAX_ENTRIES", "50000")
+)
+
+# New embeddings are written to the index at most this often (and at exit)
+EMBEDDING_CACHE_FLUSH_SECONDS = float(
+    os.environ.get("QA_EMBEDDING_CACHE_FLUSH_SECONDS", "30")
+)
+
+RAG_CHUNK_SIZE = int(os.environ.get("QA_RAG_CHUNK_SIZE", "1200"))
+RAG_CHUNK_OVERLAP = int(os.environ.get("QA_RAG_CHUNK_OVERLAP", "200"))
+RAG_EMBED_BATCH_SIZE = int(os.environ.get("QA_RAG_EMBED_BATCH_SIZE", "64"))
+RAG_EMBED_BATCH_CHARS = int(os.environ.get("QA_RAG_EMBED_BATCH_CHARS", "100000"))
+RAG_ANN_THRESHOLD = int(os.environ.get("QA_RAG_ANN_THRESHOLD", "5000"))
+
+# embedding | bm25 | hybrid
+RAG_BACKEND = os.environ.get("QA_RAG_BACKEND", "embedding")
+RAG_HYBRID_ALPHA = float(os.environ.get("QA_RAG_HYBRID_ALPHA", "0.5"))
+
+HISTORY_MAX_VERSIONS = int(os.environ.get("QA_HISTORY_MAX_VERSIONS", "200"))
+HISTORY_MAX_AGE_DAYS = int(os.environ.get("QA_HISTORY_MAX_AGE_DAYS", "0"))  # 0 = no limit
+
+PLAN_TTL_SECONDS = int(os.environ.get("QA_PLAN_TTL_SECONDS", "3600"))
+PLAN_MAX_ENTRIES = int(os.environ.get("QA_PLAN_MAX_ENTRIES", "100"))
+
+# Point at a local stand-in server for testing, e.g. http://localhost:9000/v1
+LLM_BASE_URL = os.environ.get("QA_LLM_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.environ.get("QA_LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("QA_LLM_MAX_CONCURRENCY", "8"))
+
+# Responses are deterministic (temperature 0): identical requests are cached
+LLM_CACHE_ENABLED = os.environ.get("QA_LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("QA_LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("QA_LLM_CACHE_MAX_ENTRIES", "2000"))
+
+# Shared budget for every model call in the process (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("QA_LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("QA_LLM_TOKENS_PER_MINUTE", "200000"))
+
+# Backoff for rate-limit and transient errors
+LLM_MAX_RETRIES = int(os.environ.get("QA_LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.environ.get("QA_LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.environ.get("QA_LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# Sync prompts: scenarios relevant to the document are sent in full
+# while they fit the budget, the rest by name only
+SYNC_PROMPT_TOKEN_BUDGET = int(os.environ.get("QA_SYNC_PROMPT_TOKEN_BUDGET", "48000"))
+SYNC_PROMPT_MIN_RELEVANCE = float(os.environ.get("QA_SYNC_PROMPT_MIN_RELEVANCE", "0.2"))
+
+# Documents are split into sections of at most this many characters
+SECTION_MAX_CHARS = int(os.environ.get("QA_SECTION_MAX_CHARS", "6000"))
+
+# Sharded sync: one model call per screen directory, run concurrently.
+# Used automatically from this many scenarios on (0 = only on request)
+SYNC_SHARD_MIN_SCENARIOS = int(os.environ.get("QA_SYNC_SHARD_MIN_SCENARIOS", "300"))
+SYNC_SHARD_ROUTE_RATIO = float(os.environ.get("QA_SYNC_SHARD_ROUTE_RATIO", "0.5"))
+
+# Initial generation of long documents: one model call per batch of sections
+INITIAL_GENERATION_BATCH_CHARS = int(os.environ.get("QA_INITIAL_GENERATION_BATCH_CHARS", "12000"))
+INITIAL_GENERATION_CONCURRENCY = int(os.environ.get("QA_INITIAL_GENERATION_CONCURRENCY", "4"))
+
+# Re-uploaded documents: send only changed sections unless the revision
+# is larger than this fraction of the whole document
+DOCUMENT_DIFF_MAX_RATIO = float(os.environ.get("QA_DOCUMENT_DIFF_MAX_RATIO", "0.7"))
+
+# PDF extraction: pages are extracted on a process pool when at least
+# PDF_PARALLEL_MIN_PAGES need extracting (0 = no page limit)
+PDF_EXTRACT_WORKERS = int(os.environ.get("QA_PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("QA_PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_MAX_PAGES = int(os.environ.get("QA_PDF_MAX_PAGES", "1000"))
+
+# Disk caches of extracted text: least recently used files are removed
+# past this many bytes (0 = no limit)
+PDF_PAGE_CACHE_MAX_BYTES = int(os.environ.get("QA_PDF_PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTED_TEXT_CACHE_MAX_BYTES = int(os.environ.get("QA_EXTRACTED_TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Uploads larger than this are rejected with 413 (0 = no limit)
+UPLOAD_MAX_BYTES = int(os.environ.get("QA_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Background jobs
+JOBS_DB = os.environ.get("QA_JOBS_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("QA_JOB_WORKERS", "2"))
+JOB_RETENTION_SECONDS = int(os.environ.get("QA_JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Batch /analyze
+ANALYZE_BATCH_CONCURRENCY = int(os.environ.get("QA_ANALYZE_BATCH_CONCURRENCY", "8"))
+ANALYZE_BATCH_MAX_STORIES = int(os.environ.get("QA_ANALYZE_BATCH_MAX_STORIES", "500"))
@@ -1,23 +1,6 @@
 import os
-from pypdf import PdfReader
-from docx import Document
-
-
-def read_pdf(path: str) -> str:
-    reader = PdfReader(path)
-    text = ""
-
-    for page in reader.pages:
-        content = page.extract_text()
-        if content:
-            text += content + "\n"
-
-    return text.strip()
-
-
-def read_docx(path: str) -> str:
-    doc = Document(path)
-    return "\n".join([p.text for p in doc.paragraphs]).strip()
+from core.pdf_extraction import read_pdf
+from core.docx_extraction import read_docx
 
 
 def read_txt(path: str) -> str:
@@ -25,11 +8,14 @@ def read_txt(path: str) -> str:
         return f.read().strip()
 
 
-def extract_document(path: str) -> str:
+def extract_document(path: str, pages: str = None) -> str:
+    """
+    pages selects PDF pages ("1-3,7"); other formats ignore it.
+    """
     ext = os.path.splitext(path)[1].lower()
 
     if ext == ".pdf":
-        return read_pdf(path)
+        return read_pdf(path, pages)
 
     elif ext == ".docx":
         return read_docx(path)
@@ -0,0 +1,100 @@
+import re
+import hashlib
+from core import config
+from .chunking import chunk_text
+
+
+# ============================================================
+# Document sections
+#
+# Functional documents are organized by headings: markdown (#),
+# SCREEN:/PANTALLA: markers, numbered titles ("2.1 Checkout") or
+# short upper-case lines. Text before the first heading is kept
+# as an untitled section. Sections longer than SECTION_MAX_CHARS
+# are split on paragraph boundaries and keep their title.
+# ============================================================
+
+HEADING_RES = (
+    re.compile(r"^#{1,6}\s+(?P<title>.+?)\s*#*$"),
+    re.compile(r"^(?:SCREEN|Screen|PANTALLA|Pantalla)\s*[:\-]\s*(?P<title>.+)$"),
+    # "2.1 Checkout"; single-level "1. ..." is usually a list item
+    re.compile(r"^(?P<title>\d+(?:\.\d+)+\.?\s+[^\s.].*)$"),
+)
+
+MAX_HEADING_CHARS = 80
+
+
+class Section:
+
+    __slots__ = ("title", "text")
+
+    def __init__(self, title: str, text: str):
+        self.title = title
+        self.text = text
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(
+            f"{self.title}\0{self.text}".encode("utf-8")
+        ).hexdigest()
+
+    def render(self) -> str:
+        return f"{self.title}\n{self.text}" if self.title else self.text
+
+
+def _heading(line: str):
+    stripped = line.strip()
+
+    if not stripped or len(stripped) > MAX_HEADING_CHARS:
+        return None
+
+    for pattern in HEADING_RES:
+        match = pattern.match(stripped)
+        if match:
+            return match.group("title").strip()
+
+    # Short upper-case lines ("CHECKOUT", "USER PROFILE")
+    letters = [c for c in stripped if c.isalpha()]
+    if len(letters) >= 3 and stripped.upper() == stripped and not stripped.endswith("."):
+        return stripped
+
+    return None
+
+
+def split_sections(text: str, max_chars: int = None) -> list:
+    """
+    Return the sections of text, in document order.
+    """
+    max_chars = max_chars or config.SECTION_MAX_CHARS
+
+    raw = []
+    title, lines = "", []
+
+    for line in text.splitlines():
+        heading = _heading(line)
+
+        if heading is not None:
+            raw.append((title, "\n".join(lines).strip()))
+            title, lines = heading, []
+        else:
+            lines.append(line)
+
+    raw.append((title, "\n".join(lines).strip()))
+
+    sections = []
+    for title, body in raw:
+        if not body and not title:
+            continue
+
+        if len(body) <= max_chars:
+            sections.append(Section(title, body))
+            continue
+
+        for part, (_, _, chunk) in enumerate(chunk_text(body, max_chars, 0), 1):
+            sections.append(Section(f"{title} ({part})" if title else f"({part})", chunk))
+
+    return sections
+
+
+def join_sections(sections: list) -> str:
+    return "\n\n".join(section.render() for section in sections)
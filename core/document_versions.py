@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from core import config
+from .document_sections import split_sections
+
+
+# ============================================================
+# Document versions
+#
+# The last applied version of every functional document is kept
+# next to the suite it was synced into:
+#
+#   .qa_documents/<sha256 of the identity>.json
+#       -> {identity, sha256, text, updated}
+#
+# A new upload of the same document (same identity, usually the
+# file name) is compared section by section with that version and
+# only the added, changed and removed sections are sent to the
+# model. The version is recorded when its plan is applied, so the
+# diff is always against what the suite reflects.
+# ============================================================
+
+DOCUMENTS_DIRNAME = ".qa_documents"
+
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+
+UNTITLED = "(untitled)"
+
+REVISION_HEADER = (
+    "DOCUMENT REVISION: only the sections below changed since the "
+    "last synchronized version. Sections not listed are unchanged."
+)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def document_identity(name: str) -> str:
+    return " ".join((name or "").strip().lower().split())
+
+
+class DocumentVersionStore:
+
+    def __init__(self, base_dir: str):
+        self.root = os.path.join(base_dir, DOCUMENTS_DIRNAME)
+        self._lock = threading.Lock()
+
+    def _path(self, identity: str) -> str:
+        key = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key + ".json")
+
+    def get(self, identity: str):
+        try:
+            with open(self._path(identity), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, identity: str, text: str):
+        entry = {
+            "identity": identity,
+            "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "text": text,
+            "updated": datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+        }
+
+        path = self._path(identity)
+
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+
+def get_document_store(base_dir: str) -> DocumentVersionStore:
+    key = os.path.abspath(base_dir)
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = DocumentVersionStore(base_dir)
+
+    return store
+
+
+# ============================================================
+# Section diff
+# ============================================================
+
+def diff_sections(old_text: str, new_text: str) -> list:
+    """
+    Return [(status, old section, new section)] in new-document order,
+    removed sections last. Identical sections are left out; a section
+    whose title still exists with other text is "changed".
+    """
+    old_sections = split_sections(old_text)
+    new_sections = split_sections(new_text)
+
+    unmatched = {}  # digest -> count of old sections not reused yet
+    for section in old_sections:
+        unmatched[section.digest] = unmatched.get(section.digest, 0) + 1
+
+    candidates = []
+    for section in new_sections:
+        if unmatched.get(section.digest):
+            unmatched[section.digest] -= 1
+        else:
+            candidates.append(section)
+
+    remaining = []
+    for section in old_sections:
+        if unmatched.get(section.digest):
+            unmatched[section.digest] -= 1
+            remaining.append(section)
+
+    by_title = {}
+    for section in remaining:
+        by_title.setdefault(section.title, []).append(section)
+
+    diff = []
+    for section in candidates:
+        previous = by_title.get(section.title)
+        if previous:
+            diff.append((CHANGED, previous.pop(0), section))
+        else:
+            diff.append((ADDED, None, section))
+
+    for sections in by_title.values():
+        diff.extend((REMOVED, section, None) for section in sections)
+
+    return diff
+
+
+def render_revision(diff: list) -> str:
+    """
+    Render a section diff as the document sent to the model. Every
+    entry keeps its section title as a heading so it can still be
+    routed to its screen; the marker lines are not headings.
+    """
+    parts = [REVISION_HEADER]
+
+    for status, old, new in diff:
+        title = (new or old).title or UNTITLED
+
+        if status == ADDED:
+            body = f"[ADDED SECTION] New text:\n{new.text}"
+        elif status == REMOVED:
+            body = f"[REMOVED SECTION] Previous text:\n{old.text}"
+        else:
+            body = f"[CHANGED SECTION] Previous version:\n{old.text}\n\n[CHANGED SECTION] New version:\n{new.text}"
+
+        parts.append(f"## {title}\n{body}")
+
+    return "\n\n".join(parts)
+
+
+def revision_document(previous_text: str, new_text: str):
+    """
+    Return (document to sync, report). The document is None when the
+    sections are unchanged, and the full new text when the revision
+    would not be much smaller (DOCUMENT_DIFF_MAX_RATIO).
+    """
+    diff = diff_sections(previous_text, new_text)
+
+    report = {
+        ADDED: sum(1 for status, _, _ in diff if status == ADDED),
+        CHANGED: sum(1 for status, _, _ in diff if status == CHANGED),
+        REMOVED: sum(1 for status, _, _ in diff if status == REMOVED)
+    }
+
+    if not diff:
+        return None, dict(report, mode="unchanged")
+
+    revision = render_revision(diff)
+
+    if len(revision) > len(new_text) * config.DOCUMENT_DIFF_MAX_RATIO:
+        return new_text, dict(report, mode="full")
+
+    return revision, dict(report, mode="revision")
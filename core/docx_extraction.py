@@ -0,0 +1,113 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+
+# ============================================================
+# DOCX extraction
+#
+# word/document.xml is streamed with iterparse straight from the
+# zip archive; elements are cleared as soon as their text has been
+# emitted, so memory stays flat whatever the document size.
+# Paragraphs are emitted in document order; every table row becomes
+# one line with its cells separated by " | " (nested tables are
+# folded into the text of their cell).
+# ============================================================
+
+DOCUMENT_PART = "word/document.xml"
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+P = W + "p"
+T = W + "t"
+TAB = W + "tab"
+BREAKS = (W + "br", W + "cr")
+TBL = W + "tbl"
+TR = W + "tr"
+TC = W + "tc"
+BODY = W + "body"
+
+CELL_SEPARATOR = " | "
+
+
+class _Table:
+
+    __slots__ = ("cells", "cell")
+
+    def __init__(self):
+        self.cells = []
+        self.cell = []
+
+
+def iter_docx_blocks(path: str):
+    """
+    Yield the text of every paragraph and table row, in document order.
+    """
+    with zipfile.ZipFile(path) as archive, archive.open(DOCUMENT_PART) as stream:
+
+        body = None
+        paragraphs = []  # text parts of the open paragraphs (text boxes nest)
+        tables = []
+
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            tag = elem.tag
+
+            if event == "start":
+                if tag == P:
+                    paragraphs.append([])
+                elif tag == TBL:
+                    tables.append(_Table())
+                elif tag == TR and tables:
+                    tables[-1].cells = []
+                elif tag == TC and tables:
+                    tables[-1].cell = []
+                elif tag == BODY:
+                    body = elem
+                continue
+
+            if tag == T:
+                if paragraphs and elem.text:
+                    paragraphs[-1].append(elem.text)
+
+            elif tag == TAB:
+                if paragraphs:
+                    paragraphs[-1].append("\t")
+
+            elif tag in BREAKS:
+                if paragraphs:
+                    paragraphs[-1].append("\n")
+
+            elif tag == P:
+                text = "".join(paragraphs.pop())
+
+                if tables:
+                    tables[-1].cell.append(text)
+                else:
+                    yield text
+
+            elif tag == TC and tables:
+                table = tables[-1]
+                table.cells.append(" ".join(t.strip() for t in table.cell if t.strip()))
+
+            elif tag == TR and tables:
+                row = CELL_SEPARATOR.join(tables[-1].cells)
+
+                if len(tables) > 1:
+                    tables[-2].cell.append(row)
+                elif row.strip(" |"):
+                    yield row
+
+            elif tag == TBL and tables:
+                tables.pop()
+
+            else:
+                continue
+
+            elem.clear()
+
+            # Drop emitted top-level blocks from the tree
+            if body is not None and not paragraphs and not tables:
+                body.clear()
+
+
+def read_docx(path: str) -> str:
+    return "\n".join(iter_docx_blocks(path)).strip()
@@ -0,0 +1,284 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from core import config
+
+
+# ============================================================
+# Content-addressed embedding cache
+#
+# One directory per embedding model:
+#
+#   <CACHE_DIR>/embeddings/<model>/vectors.f32  -> raw float32 rows
+#   <CACHE_DIR>/embeddings/<model>/index.json   -> key -> row (LRU order)
+#
+# Keys are sha256(model + text). Rows are memory-mapped and reused
+# in place when the least recently used entries are evicted.
+#
+# The index is rewritten in the background at most every
+# QA_EMBEDDING_CACHE_FLUSH_SECONDS, and at exit. Evicted rows are
+# only reused once a written index no longer points at them, so an
+# index left on disk by a crash never maps a key to another vector.
+# ============================================================
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+
+GROWTH_ROWS = 1024
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(self, directory: str, model: str, max_entries: int):
+        self.directory = directory
+        self.model = model
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()  # key -> row, oldest first
+        self._free = []
+        self._released = []  # evicted rows the index on disk may still use
+        self._dim = None
+        self._capacity = 0
+        self._vectors = None
+        self._dirty = False
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()
+
+        self._load()
+
+    # --------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------
+
+    def _vectors_path(self):
+        return os.path.join(self.directory, VECTORS_FILE)
+
+    def _index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load(self):
+        index_path = self._index_path()
+        vectors_path = self._vectors_path()
+
+        if not os.path.exists(index_path) or not os.path.exists(vectors_path):
+            return
+
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        dim = data.get("dim")
+        if not dim:
+            return
+
+        capacity = os.path.getsize(vectors_path) // (dim * 4)
+        rows = [(k, r) for k, r in data.get("rows", []) if r < capacity]
+
+        self._dim = dim
+        self._capacity = capacity
+        self._vectors = np.memmap(
+            vectors_path, dtype="float32", mode="r+", shape=(capacity, dim)
+        )
+        self._rows = OrderedDict(rows)
+
+        used = set(self._rows.values())
+        self._free = [r for r in range(capacity) if r not in used]
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity - self._capacity < needed:
+            capacity += GROWTH_ROWS
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        if self._vectors is not None:
+            self._vectors.flush()
+
+        with open(self._vectors_path(), "ab") as f:
+            f.truncate(capacity * self._dim * 4)
+
+        self._free.extend(range(self._capacity, capacity))
+        self._capacity = capacity
+        self._vectors = np.memmap(
+            self._vectors_path(), dtype="float32", mode="r+",
+            shape=(capacity, self._dim)
+        )
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flush_timer = None
+
+                if not self._dirty:
+                    return
+
+                os.makedirs(self.directory, exist_ok=True)
+
+                if self._vectors is not None:
+                    self._vectors.flush()
+
+                # Serialized outside the lock: lookups and stores go on
+                snapshot = {
+                    "model": self.model,
+                    "dim": self._dim,
+                    "rows": list(self._rows.items())
+                }
+                released = self._released
+                self._released = []
+                self._dirty = False
+
+            try:
+                tmp_path = self._index_path() + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+
+                os.replace(tmp_path, self._index_path())
+
+            except OSError as e:
+                print(f"[EMBEDDING CACHE] Index flush failed: {e}")
+                with self._lock:
+                    self._released.extend(released)
+                    self._dirty = True
+                return
+
+            with self._lock:
+                self._free.extend(released)
+
+    def _schedule_flush(self):
+        # Called with the lock held
+        if self._flush_timer is not None:
+            return
+
+        self._flush_timer = threading.Timer(config.EMBEDDING_CACHE_FLUSH_SECONDS, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    # --------------------------------------------------------
+    # Lookup / store
+    # --------------------------------------------------------
+
+    def lookup(self, texts: list):
+        """
+        Return (vectors_by_position, missing_positions) for texts.
+        """
+        found = {}
+        missing = []
+
+        with self._lock:
+            for pos, text in enumerate(texts):
+                key = _cache_key(self.model, text)
+                row = self._rows.get(key)
+
+                if row is None:
+                    missing.append(pos)
+                    continue
+
+                self._rows.move_to_end(key)
+                found[pos] = np.array(self._vectors[row])
+
+            self.hits += len(found)
+            self.misses += len(missing)
+
+            if found:
+                self._dirty = True
+
+        return found, missing
+
+    def store(self, texts: list, vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+
+            if vectors.shape[1] != self._dim:
+                return
+
+            new_keys = []
+            for text in texts:
+                key = _cache_key(self.model, text)
+                if key not in self._rows and key not in new_keys:
+                    new_keys.append(key)
+
+            # Evict least recently used entries over the bound
+            overflow = len(self._rows) + len(new_keys) - self.max_entries
+            while overflow > 0 and self._rows:
+                _, row = self._rows.popitem(last=False)
+                self._released.append(row)
+                self.evictions += 1
+                overflow -= 1
+
+            if len(self._free) < len(new_keys):
+                self._grow(len(new_keys) - len(self._free))
+
+            for text, vector in zip(texts, vectors):
+                key = _cache_key(self.model, text)
+                if key in self._rows:
+                    continue
+
+                row = self._free.pop()
+                self._vectors[row] = vector
+                self._rows[key] = row
+
+            self._dirty = True
+            self._schedule_flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model,
+            "entries": len(self._rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# ============================================================
+# Shared instances
+# ============================================================
+
+def get_embedding_cache(model: str) -> EmbeddingCache:
+    with _caches_lock:
+        cache = _caches.get(model)
+
+        if cache is None:
+            directory = os.path.join(
+                config.CACHE_DIR, "embeddings", model.replace("/", "_")
+            )
+            cache = EmbeddingCache(
+                directory, model, config.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            _caches[model] = cache
+
+        return cache
+
+
+def embedding_cache_stats() -> list:
+    return [cache.stats() for cache in _caches.values()]
+
+
+@atexit.register
+def _flush_all():
+    for cache in _caches.values():
+        cache.flush()
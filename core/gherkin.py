@@ -0,0 +1,308 @@
+# ============================================================
+# Gherkin parser
+#
+# Single-pass parser producing a compact __slots__ AST. Every
+# node keeps the 0-based line index it came from, so the patch
+# engine can edit the original lines without rescanning them.
+#
+# Supported: tags, Feature description, Background, Rule,
+# Scenario / Example, Scenario Outline / Template, Examples,
+# doc strings (""" and ```), data tables and # comments.
+# ============================================================
+
+STEP_KEYWORDS = ("Given", "When", "Then", "And", "But", "*")
+
+SCENARIO_KEYWORDS = ("Scenario Outline", "Scenario Template", "Scenario", "Example")
+EXAMPLES_KEYWORDS = ("Examples", "Scenarios")
+
+DOC_STRING_DELIMITERS = ('"""', "```")
+
+
+class Step:
+
+    __slots__ = ("keyword", "text", "line", "doc_string", "data_table")
+
+    def __init__(self, keyword: str, text: str, line: int):
+        self.keyword = keyword
+        self.text = text
+        self.line = line
+        self.doc_string = None
+        self.data_table = None
+
+    @property
+    def full(self) -> str:
+        return f"{self.keyword} {self.text}" if self.text else self.keyword
+
+
+class Examples:
+
+    __slots__ = ("name", "line", "tags", "header", "rows")
+
+    def __init__(self, name: str, line: int, tags: tuple):
+        self.name = name
+        self.line = line
+        self.tags = tags
+        self.header = None
+        self.rows = []
+
+
+class Background:
+
+    __slots__ = ("name", "line", "steps")
+
+    def __init__(self, name: str, line: int):
+        self.name = name
+        self.line = line
+        self.steps = []
+
+
+class Scenario:
+
+    __slots__ = (
+        "keyword", "name", "line", "start_line", "end_line",
+        "tags", "rule", "steps", "examples"
+    )
+
+    def __init__(self, keyword: str, name: str, line: int, start_line: int,
+                 tags: tuple, rule: str = None):
+        self.keyword = keyword
+        self.name = name
+        self.line = line
+        self.start_line = start_line  # first tag line, or the keyword line
+        self.end_line = None  # exclusive
+        self.tags = tags
+        self.rule = rule
+        self.steps = []
+        self.examples = []
+
+    @property
+    def is_outline(self) -> bool:
+        return self.keyword in ("Scenario Outline", "Scenario Template")
+
+
+class FeatureFile:
+
+    __slots__ = (
+        "name", "line", "tags", "description", "background",
+        "scenarios", "scenario_map", "line_count"
+    )
+
+    def __init__(self):
+        self.name = None
+        self.line = None
+        self.tags = ()
+        self.description = []
+        self.background = None
+        self.scenarios = []
+        self.scenario_map = {}
+        self.line_count = 0
+
+    def get_scenario(self, name: str):
+        return self.scenario_map.get(name.strip()) if name else None
+
+
+# ============================================================
+# Parsing
+# ============================================================
+
+def _match_keyword(stripped: str, keywords: tuple):
+    for keyword in keywords:
+        if stripped.startswith(keyword + ":"):
+            return keyword, stripped[len(keyword) + 1:].strip()
+    return None, None
+
+
+def _match_step(stripped: str):
+    for keyword in STEP_KEYWORDS:
+        if stripped == keyword:
+            return keyword, ""
+        if stripped.startswith(keyword + " "):
+            return keyword, stripped[len(keyword) + 1:].strip()
+    return None, None
+
+
+def _table_cells(stripped: str) -> tuple:
+    return tuple(cell.strip() for cell in stripped.strip("|").split("|"))
+
+
+def parse_feature(text: str) -> FeatureFile:
+
+    feature = FeatureFile()
+
+    lines = text.splitlines()
+    feature.line_count = len(lines)
+
+    pending_tags = []
+    pending_tags_line = None
+
+    rule = None
+    block = None  # Background or Scenario currently receiving steps
+    scenario = None
+    examples = None
+    last_step = None
+
+    doc_delimiter = None
+    doc_indent = 0
+    doc_lines = None
+
+    def close_scenario(end_line):
+        if scenario is not None and scenario.end_line is None:
+            scenario.end_line = end_line
+
+    for i, line in enumerate(lines):
+
+        stripped = line.strip()
+
+        # ----------------------------------------------
+        # Doc string body
+        # ----------------------------------------------
+        if doc_delimiter is not None:
+            if stripped.startswith(doc_delimiter):
+                if last_step is not None:
+                    last_step.doc_string = "\n".join(doc_lines)
+                doc_delimiter = None
+                doc_lines = None
+            else:
+                indent = len(line) - len(line.lstrip())
+                doc_lines.append(line[min(indent, doc_indent):])
+            continue
+
+        if not stripped or stripped.startswith("#"):
+            continue
+
+        if stripped.startswith(DOC_STRING_DELIMITERS):
+            doc_delimiter = stripped[:3]
+            doc_indent = len(line) - len(line.lstrip())
+            doc_lines = []
+            continue
+
+        # ----------------------------------------------
+        # Tables (data tables or Examples rows)
+        # ----------------------------------------------
+        if stripped.startswith("|"):
+            cells = _table_cells(stripped)
+
+            if examples is not None:
+                if examples.header is None:
+                    examples.header = cells
+                else:
+                    examples.rows.append(cells)
+
+            elif last_step is not None:
+                if last_step.data_table is None:
+                    last_step.data_table = []
+                last_step.data_table.append(cells)
+
+            continue
+
+        # ----------------------------------------------
+        # Tags
+        # ----------------------------------------------
+        if stripped.startswith("@"):
+            if not pending_tags:
+                pending_tags_line = i
+            pending_tags.extend(stripped.split())
+            continue
+
+        tags = tuple(pending_tags)
+        tags_line = pending_tags_line if pending_tags else i
+        pending_tags = []
+        pending_tags_line = None
+
+        # ----------------------------------------------
+        # Block keywords
+        # ----------------------------------------------
+        if stripped.startswith("Feature:"):
+            feature.name = stripped[len("Feature:"):].strip()
+            feature.line = i
+            feature.tags = tags
+            continue
+
+        if stripped.startswith("Rule:"):
+            close_scenario(tags_line)
+            rule = stripped[len("Rule:"):].strip()
+            block = scenario = examples = last_step = None
+            continue
+
+        if stripped.startswith("Background:"):
+            close_scenario(tags_line)
+            feature.background = Background(stripped[len("Background:"):].strip(), i)
+            block = feature.background
+            scenario = examples = last_step = None
+            continue
+
+        keyword, name = _match_keyword(stripped, SCENARIO_KEYWORDS)
+        if keyword:
+            close_scenario(tags_line)
+            scenario = Scenario(keyword, name, i, tags_line, tags, rule)
+            feature.scenarios.append(scenario)
+            feature.scenario_map.setdefault(name, scenario)
+            block = scenario
+            examples = last_step = None
+            continue
+
+        keyword, name = _match_keyword(stripped, EXAMPLES_KEYWORDS)
+        if keyword:
+            if scenario is not None:
+                examples = Examples(name, i, tags)
+                scenario.examples.append(examples)
+            last_step = None
+            continue
+
+        # ----------------------------------------------
+        # Steps
+        # ----------------------------------------------
+        keyword, step_text = _match_step(stripped)
+        if keyword:
+            if block is not None:
+                last_step = Step(keyword, step_text, i)
+                block.steps.append(last_step)
+            continue
+
+        # ----------------------------------------------
+        # Free text (feature description)
+        # ----------------------------------------------
+        if feature.line is not None and block is None and rule is None:
+            feature.description.append(stripped)
+
+    close_scenario(len(lines))
+
+    return feature
+
+
+# ============================================================
+# Views
+# ============================================================
+
+def to_structure(feature: FeatureFile, file: str) -> dict:
+    """
+    Prompt-friendly view: {"feature", "file", "scenarios": [{"name", "steps"}]}.
+    Background, tags and Examples are included only when present.
+    """
+    structured = {
+        "feature": feature.name,
+        "file": file,
+        "scenarios": []
+    }
+
+    if feature.background is not None:
+        structured["background"] = [s.full for s in feature.background.steps]
+
+    for scenario in feature.scenarios:
+        item = {
+            "name": scenario.name,
+            "steps": [s.full for s in scenario.steps]
+        }
+
+        if scenario.tags:
+            item["tags"] = list(scenario.tags)
+
+        if scenario.examples:
+            item["examples"] = [
+                [list(ex.header or ())] + [list(row) for row in ex.rows]
+                for ex in scenario.examples
+            ]
+
+        structured["scenarios"].append(item)
+
+    return structured
@@ -0,0 +1,264 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from core import config
+from core.suite_index import get_suite_index
+from core.atomic_writer import write_files_atomic
+
+
+# ============================================================
+# Content-addressed suite history
+#
+# Layout (at the root of the features directory):
+#
+#   .qa_history/objects/ab/cdef...  -> zlib-compressed blobs keyed by sha256
+#   .qa_history/log.jsonl           -> one line per suite version
+#
+# A version points to a manifest blob ({relative path: blob sha256})
+# describing the whole suite, so unchanged files and identical suites
+# are stored once. Any logged version can be restored in one call.
+# ============================================================
+
+HISTORY_DIRNAME = ".qa_history"
+OBJECTS_DIRNAME = "objects"
+LOG_FILE = "log.jsonl"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class HistoryStore:
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.root = os.path.join(base_dir, HISTORY_DIRNAME)
+        self.objects_dir = os.path.join(self.root, OBJECTS_DIRNAME)
+        self.log_path = os.path.join(self.root, LOG_FILE)
+        self._lock = threading.RLock()
+        self._versions = None
+
+    # --------------------------------------------------------
+    # Objects
+    # --------------------------------------------------------
+
+    def _object_path(self, sha: str) -> str:
+        return os.path.join(self.objects_dir, sha[:2], sha[2:])
+
+    def _put_object(self, content: str, sha: str = None) -> str:
+        sha = sha or content_hash(content)
+        path = self._object_path(sha)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(content.encode("utf-8")))
+            os.replace(tmp_path, path)
+
+        return sha
+
+    def _get_object(self, sha: str) -> str:
+        with open(self._object_path(sha), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8")
+
+    def _get_manifest(self, sha: str) -> dict:
+        return json.loads(self._get_object(sha))
+
+    # --------------------------------------------------------
+    # Log
+    # --------------------------------------------------------
+
+    def versions(self) -> list:
+        with self._lock:
+            if self._versions is None:
+                self._versions = []
+
+                if os.path.exists(self.log_path):
+                    with open(self.log_path, encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip():
+                                self._versions.append(json.loads(line))
+
+            return list(self._versions)
+
+    def _append(self, entry: dict):
+        os.makedirs(self.root, exist_ok=True)
+
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._versions.append(entry)
+
+    def _log_version(self, manifest: dict, action: str, changed: list) -> dict:
+        versions = self.versions()
+
+        entry = {
+            "version": versions[-1]["version"] + 1 if versions else 1,
+            "timestamp": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "action": action,
+            "manifest": self._put_object(json.dumps(manifest, sort_keys=True)),
+            "files": len(manifest),
+            "changed": sorted(changed)
+        }
+
+        self._append(entry)
+        return entry
+
+    # --------------------------------------------------------
+    # Recording
+    # --------------------------------------------------------
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+
+    def record(self, current: dict, changed: dict, action: str) -> dict:
+        """
+        Log a new suite version.
+
+        current -> {path: content} of the suite before the write
+        changed -> {path: content} written by the operation
+        deleted paths may be passed in changed with content None.
+        """
+        with self._lock:
+            versions = self.versions()
+
+            before = {self._relpath(p): content_hash(c) for p, c in current.items()}
+
+            last_manifest = (
+                self._get_manifest(versions[-1]["manifest"]) if versions else None
+            )
+
+            # Keep the pre-write state restorable when it was never logged
+            if before != last_manifest:
+                for path, content in current.items():
+                    self._put_object(content, before[self._relpath(path)])
+                self._log_version(before, "snapshot", [])
+
+            after = dict(before)
+            for path, content in changed.items():
+                rel = self._relpath(path)
+                if content is None:
+                    after.pop(rel, None)
+                else:
+                    after[rel] = self._put_object(content)
+
+            entry = self._log_version(after, action, list(map(self._relpath, changed)))
+
+            # Collect in batches instead of on every write past the limit
+            slack = max(1, config.HISTORY_MAX_VERSIONS // 10)
+            if len(self._versions) >= config.HISTORY_MAX_VERSIONS + slack:
+                self.gc()
+
+            return entry
+
+    # --------------------------------------------------------
+    # Restore
+    # --------------------------------------------------------
+
+    def restore(self, version: int) -> dict:
+        with self._lock:
+            target = next(
+                (v for v in self.versions() if v["version"] == version), None
+            )
+
+            if target is None:
+                raise ValueError(f"Unknown history version: {version}")
+
+            manifest = self._get_manifest(target["manifest"])
+            entries = get_suite_index(self.base_dir).refresh()
+            current = {path: entry.text for path, entry in entries.items()}
+
+            changed = {}
+
+            for rel, sha in manifest.items():
+                path = os.path.join(self.base_dir, *rel.split("/"))
+                entry = entries.get(path)
+                if entry is None or content_hash(entry.text) != sha:
+                    changed[path] = self._get_object(sha)
+
+            deleted = [
+                path for path in current
+                if self._relpath(path) not in manifest
+            ]
+
+            write_files_atomic(changed)
+
+            for path in deleted:
+                os.remove(path)
+
+                directory = os.path.dirname(path)
+                if directory != self.base_dir and not os.listdir(directory):
+                    os.rmdir(directory)
+
+            changed.update({path: None for path in deleted})
+
+            return self.record(current, changed, f"restore:{version}")
+
+    # --------------------------------------------------------
+    # Retention
+    # --------------------------------------------------------
+
+    def gc(self) -> dict:
+        """
+        Drop versions beyond HISTORY_MAX_VERSIONS / HISTORY_MAX_AGE_DAYS
+        and delete every object no retained version references.
+        """
+        with self._lock:
+            versions = self.versions()
+            kept = versions[-config.HISTORY_MAX_VERSIONS:]
+
+            if config.HISTORY_MAX_AGE_DAYS > 0:
+                cutoff = (
+                    datetime.utcnow() - timedelta(days=config.HISTORY_MAX_AGE_DAYS)
+                ).isoformat()
+                recent = [v for v in kept if v["timestamp"] >= cutoff]
+                kept = recent or kept[-1:]
+
+            if len(kept) != len(versions):
+                tmp_path = self.log_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for entry in kept:
+                        f.write(json.dumps(entry) + "\n")
+                os.replace(tmp_path, self.log_path)
+                self._versions = list(kept)
+
+            referenced = set()
+            for entry in kept:
+                referenced.add(entry["manifest"])
+                referenced.update(self._get_manifest(entry["manifest"]).values())
+
+            removed = 0
+            if os.path.exists(self.objects_dir):
+                for prefix in os.listdir(self.objects_dir):
+                    prefix_dir = os.path.join(self.objects_dir, prefix)
+                    for name in os.listdir(prefix_dir):
+                        if prefix + name not in referenced:
+                            os.remove(os.path.join(prefix_dir, name))
+                            removed += 1
+
+            return {
+                "versions_removed": len(versions) - len(kept),
+                "objects_removed": removed
+            }
+
+
+def get_history_store(base_dir: str = None) -> HistoryStore:
+    key = os.path.abspath(base_dir or config.BASE_FEATURES_DIR)
+
+    with _stores_lock:
+        store = _stores.get(key)
+
+        if store is None:
+            store = HistoryStore(key)
+            _stores[key] = store
+
+        return store
@@ -1,10 +1,12 @@
 import os
-from core import config
+from core.suite_index import get_suite_index
+from core.atomic_writer import write_files_atomic
+from core.history import get_history_store
 
 
-def apply_initial_generation(initial_plan: dict, simulate: bool = False):
+def apply_initial_generation(initial_plan: dict, simulate: bool, base_dir: str):
 
-    base = config.BASE_FEATURES_DIR
+    base = base_dir
     in_memory_files = {}
 
     for feature in initial_plan["features"]:
@@ -13,7 +15,6 @@ def apply_initial_generation(initial_plan: dict, simulate: bool = False):
         feature_name = feature["feature_name"]
 
         screen_dir = os.path.join(base, screen)
-        os.makedirs(screen_dir, exist_ok=True)
 
         filename = feature_name.lower().replace(" ", "_") + ".feature"
         path = os.path.join(screen_dir, filename)
@@ -35,8 +36,24 @@ def apply_initial_generation(initial_plan: dict, simulate: bool = False):
     if simulate:
         return {path: "".join(lines) for path, lines in in_memory_files.items()}
 
+    # Only files whose content differs from disk are written
+    entries = get_suite_index(base).refresh()
+    changed = {}
+
     for path, lines in in_memory_files.items():
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(lines)
+        content = "".join(lines)
+        entry = entries.get(os.path.abspath(path))
+
+        if entry is None or entry.text != content:
+            changed[path] = content
+
+    write_files_atomic(changed)
+
+    if changed:
+        get_history_store(base).record(
+            {path: entry.text for path, entry in entries.items()},
+            {os.path.abspath(path): content for path, content in changed.items()},
+            "initial_generation"
+        )
 
-    return True
\ No newline at end of file
+    return True
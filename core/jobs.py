@@ -0,0 +1,420 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from core import config
+from core.agent import run_analyze_agent
+from core.sync_service import run_sync
+from core.uploads import SpooledUpload, extract_upload, local_upload
+
+
+# ============================================================
+# Background jobs
+#
+# Sync and analyze requests can run as jobs: submitting returns a
+# job ID at once and QA_JOB_WORKERS asyncio workers run the queued
+# jobs in submission order. Job state lives in SQLite (QA_JOBS_DB),
+# so it survives restarts: jobs that were queued or running when
+# the server stopped are queued again (syncs are dry runs, running
+# them twice is harmless). Uploaded documents are spooled next to
+# the database and removed once their job finishes.
+# ============================================================
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+SYNC = "sync"
+ANALYZE = "analyze"
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    batch_id TEXT,
+    label TEXT,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+COLUMNS = ("id", "kind", "status", "batch_id", "label", "created", "started", "finished", "error")
+
+
+class JobNotFoundError(Exception):
+    pass
+
+
+class JobStateError(Exception):
+    pass
+
+
+# ============================================================
+# Store
+# ============================================================
+
+class JobStore:
+
+    def __init__(self, path: str):
+        self.path = path
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _row(self, row) -> dict:
+        return dict(zip(COLUMNS, row))
+
+    def create(self, kind: str, params: dict, batch_id: str = None, label: str = None,
+               job_id: str = None) -> dict:
+        job_id = job_id or uuid.uuid4().hex
+
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, batch_id, label, params, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, batch_id, label, json.dumps(params), time.time())
+            )
+            self._db.commit()
+
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        if row is None:
+            raise JobNotFoundError(f"Unknown job: {job_id}")
+
+        return self._row(row)
+
+    def params(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def result(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def list(self, batch_id: str = None, status: str = None, limit: int = 100) -> list:
+        query = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+        clauses, args = [], []
+
+        if batch_id:
+            clauses.append("batch_id = ?")
+            args.append(batch_id)
+        if status:
+            clauses.append("status = ?")
+            args.append(status)
+
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        query += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+
+        return [self._row(row) for row in rows]
+
+    def counts(self, batch_id: str = None) -> dict:
+        query = "SELECT status, COUNT(*) FROM jobs"
+        args = ()
+
+        if batch_id:
+            query += " WHERE batch_id = ?"
+            args = (batch_id,)
+
+        with self._lock:
+            rows = self._db.execute(query + " GROUP BY status", args).fetchall()
+
+        return dict(rows)
+
+    def start(self, job_id: str) -> bool:
+        """
+        queued -> running; False when the job was cancelled meanwhile.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, started = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED)
+            )
+            self._db.commit()
+
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, status: str, result=None, error: str = None) -> bool:
+        """
+        Move an unfinished job to a final status; False if it already was.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?"
+                f" WHERE id = ? AND status NOT IN ({', '.join('?' * len(FINISHED))})",
+                (status, json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id, *FINISHED)
+            )
+            self._db.commit()
+
+        return cursor.rowcount == 1
+
+    def requeue_unfinished(self) -> list:
+        """
+        Queue again the jobs a previous process left running; return
+        the IDs of every queued job, oldest first.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?",
+                (QUEUED, RUNNING)
+            )
+            self._db.commit()
+
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created", (QUEUED,)
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def prune(self, older_than: float) -> list:
+        """
+        Delete finished jobs older than the timestamp; return their params.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, params FROM jobs WHERE finished < ?"
+                f" AND status IN ({', '.join('?' * len(FINISHED))})",
+                (older_than, *FINISHED)
+            ).fetchall()
+
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in rows])
+            self._db.commit()
+
+        return [json.loads(row[1]) for row in rows]
+
+
+# ============================================================
+# Runners
+# ============================================================
+
+async def _run_sync_job(params: dict):
+    if params.get("upload"):
+        upload = SpooledUpload(**params["upload"])
+    elif params.get("file"):
+        upload = await asyncio.to_thread(local_upload, params["file"])
+    else:
+        upload = None
+
+    if upload is not None:
+        document = await asyncio.to_thread(extract_upload, upload, params.get("pages"))
+    else:
+        document = params["text"]
+
+    return await run_sync(
+        document,
+        params.get("base_dir"),
+        use_cache=not params.get("no_cache", False),
+        sharded=params.get("sharded"),
+        document_id=params.get("document_id"),
+        full_document=params.get("full_document", False)
+    )
+
+
+async def _run_analyze_job(params: dict):
+    return await run_analyze_agent(
+        params["story"], use_cache=not params.get("no_cache", False)
+    )
+
+
+RUNNERS = {
+    SYNC: _run_sync_job,
+    ANALYZE: _run_analyze_job
+}
+
+
+def _discard_upload(params: dict):
+    # Only spooled uploads belong to the job; folder files do not
+    if params and params.get("upload"):
+        SpooledUpload(**params["upload"]).discard()
+
+
+# ============================================================
+# Queue
+# ============================================================
+
+class JobQueue:
+
+    def __init__(self, store: JobStore, workers: int):
+        self.store = store
+        self.workers = workers
+        self.uploads_dir = os.path.join(os.path.dirname(os.path.abspath(store.path)), "job_uploads")
+
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._running = {}  # job id -> asyncio.Task
+
+    def start(self):
+        """
+        Start the workers on the running event loop (once per loop).
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._loop is loop:
+            return
+
+        # First use on this event loop: start the workers and pick up
+        # whatever a previous process left queued
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._running = {}
+
+        for job_params in self.store.prune(time.time() - config.JOB_RETENTION_SECONDS):
+            _discard_upload(job_params)
+
+        for job_id in self.store.requeue_unfinished():
+            self._queue.put_nowait(job_id)
+
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+        print(f"[JOBS] {self.workers} worker(s), {self._queue.qsize()} job(s) queued")
+
+    async def submit(self, kind: str, params: dict, batch_id: str = None,
+                     label: str = None, job_id: str = None) -> dict:
+        if kind not in RUNNERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self.start()
+
+        job = self.store.create(kind, params, batch_id, label, job_id)
+        self._queue.put_nowait(job["id"])
+
+        return job
+
+    def cancel(self, job_id: str) -> dict:
+        job = self.store.get(job_id)
+
+        if job["status"] in FINISHED:
+            raise JobStateError(f"Job already {job['status']}")
+
+        if self.store.finish(job_id, CANCELLED):
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+            else:
+                _discard_upload(self.store.params(job_id))
+
+        return self.store.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"[JOBS] Worker error on {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        if not self.store.start(job_id):
+            return
+
+        job = self.store.get(job_id)
+        params = self.store.params(job_id)
+
+        task = asyncio.ensure_future(RUNNERS[job["kind"]](params))
+        self._running[job_id] = task
+
+        try:
+            result = await task
+
+        except asyncio.CancelledError:
+            if not task.done():
+                # The worker itself is stopping: the job stays running
+                # and is queued again on the next start
+                task.cancel()
+                raise
+            # Otherwise cancel() already recorded the status
+
+        except Exception as e:
+            self.store.finish(job_id, FAILED, error=str(e))
+
+        else:
+            self.store.finish(job_id, SUCCEEDED, result=result)
+
+        finally:
+            self._running.pop(job_id, None)
+
+        _discard_upload(params)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "jobs": self.store.counts()
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(JobStore(config.JOBS_DB), config.JOB_WORKERS)
+
+    return _queue
+
+
+def list_folder_documents(folder: str, recursive: bool = False) -> list:
+    """
+    Supported documents in folder, sorted by path.
+    """
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Not a folder: {folder}")
+
+    paths = []
+
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+
+        for name in files:
+            if os.path.splitext(name)[1].lower() in DOCUMENT_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+
+        if not recursive:
+            break
+
+    return sorted(paths)
@@ -0,0 +1,374 @@
+import re
+import json
+import enum
+import typing
+from pydantic import BaseModel, ValidationError
+
+
+# ============================================================
+# Local repair of model output
+#
+# Most invalid answers are cheap to fix without another round-trip:
+#
+#   text   -> code fences and surrounding prose are stripped, trailing
+#             commas removed and truncated structures cut back to the
+#             last whole list item, then closed
+#   schema -> enum/literal values are matched case-insensitively,
+#             missing optional fields become null, explicit null lists
+#             become empty and null entries in lists of strings are
+#             dropped; missing required fields are left as errors
+#
+# What is still invalid afterwards is reported per item, so callers
+# can re-prompt for those items only.
+# ============================================================
+
+FENCE = "```"
+LANGUAGE_TAG_RE = re.compile(r"[A-Za-z]\w*")
+
+
+# ------------------------------------------------------------
+# Text
+# ------------------------------------------------------------
+
+def extract_json_text(content: str) -> str:
+    """
+    Return content from its first { or [ on, without code fences.
+    """
+    text = content.strip()
+
+    if FENCE in text:
+        after = text.split(FENCE, 1)[1]
+        # Drop the language tag (```json) if there is one
+        tag = LANGUAGE_TAG_RE.match(after)
+        if tag:
+            after = after[tag.end():]
+        text = after.split(FENCE, 1)[0]
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+
+    return text[min(starts):] if starts else text
+
+
+def _strip_trailing_comma(out: list):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def _closed(out: list, stack: list) -> str:
+    text = "".join(out).rstrip()
+
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += "null"
+
+    return text + "".join(reversed(stack))
+
+
+def _cut_rank(out: list, stack: list) -> int:
+    """
+    How much cutting at this comma keeps of a cut-off list item:
+    0 = nothing, 1 = only enclosing items (it follows a whole object
+    or list), 2 = a part of one.
+    """
+    if "]" not in stack[:-1]:
+        return 0
+
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+
+    if stack[-1] == "]" and i >= 0 and out[i] in "}]":
+        return 1
+
+    return 2
+
+
+def repair_json_text(text: str):
+    """
+    Remove trailing commas and close a truncated JSON value.
+    Returns the repaired text, or None if it cannot be repaired.
+    """
+    out = []
+    stack = []
+    cuts = []  # (position, open brackets, rank) per comma outside strings
+    in_string = False
+    escaped = False
+
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+        elif ch == ",":
+            cuts.append((len(out), list(stack), _cut_rank(out, stack)))
+
+        out.append(ch)
+
+        if not stack and ch in "}]":
+            break
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+
+    candidates = [_closed(out, stack)]
+
+    if stack:
+        # Truncated: prefer dropping cut-off list items as a whole over
+        # keeping part of one, and later cuts over earlier ones
+        ranked = sorted(reversed(cuts), key=lambda cut: cut[2])
+        candidates = [_closed(out[:pos], st) for pos, st, _ in ranked] + candidates
+
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+
+    return None
+
+
+def parse_model_json(content):
+    """
+    json.loads for model output, repairing it locally when needed.
+    Raises json.JSONDecodeError if nothing usable is found.
+    """
+    if not isinstance(content, str):
+        return content
+
+    text = extract_json_text(content)
+
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text)
+        return value
+    except ValueError as e:
+        repaired = repair_json_text(text)
+
+        if repaired is None:
+            raise json.JSONDecodeError(f"Unrepairable JSON: {e.msg}", e.doc, e.pos)
+
+        print("[JSON REPAIR] Repaired malformed model output locally")
+        return json.loads(repaired)
+
+
+# ------------------------------------------------------------
+# Schema
+# ------------------------------------------------------------
+
+def _unwrap_optional(annotation):
+    args = typing.get_args(annotation)
+
+    if typing.get_origin(annotation) is typing.Union and type(None) in args:
+        rest = [a for a in args if a is not type(None)]
+        return (rest[0] if len(rest) == 1 else annotation), True
+
+    return annotation, False
+
+
+def _is_list(annotation) -> bool:
+    return typing.get_origin(annotation) in (list, typing.List)
+
+
+def _annotation_at(model_cls, loc):
+    """
+    Return (annotation, nullable) of the field at a validation error
+    location, or (None, False) when it cannot be resolved.
+    """
+    annotation, nullable = model_cls, False
+
+    for part in loc:
+        annotation, _ = _unwrap_optional(annotation)
+
+        if isinstance(part, int):
+            if not _is_list(annotation):
+                return None, False
+            annotation = typing.get_args(annotation)[0]
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            field = annotation.model_fields.get(part)
+            if field is None:
+                return None, False
+            annotation = field.annotation
+        else:
+            return None, False
+
+        annotation, nullable = _unwrap_optional(annotation)
+
+    return annotation, nullable
+
+
+def _choices(annotation) -> list:
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return [member.value for member in annotation]
+
+    if typing.get_origin(annotation) is typing.Literal:
+        return list(typing.get_args(annotation))
+
+    return []
+
+
+def _normalize(value) -> str:
+    return str(value).strip().lower().replace("-", "_").replace(" ", "_")
+
+
+def _container(data, loc):
+    for part in loc[:-1]:
+        try:
+            data = data[part]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _fix(data, error: dict, model_cls, removals: list) -> bool:
+    """
+    Apply the local fix for one validation error. Returns True if fixed.
+    """
+    loc = error["loc"]
+    if not loc:
+        return False
+
+    annotation, nullable = _annotation_at(model_cls, loc)
+    container = _container(data, loc)
+    key = loc[-1]
+    value = error.get("input")
+    kind = error["type"]
+
+    if container is None or annotation is None:
+        return False
+
+    # A missing required field (often a truncated item) is not made
+    # up locally: it is re-prompted
+    if kind == "missing" and isinstance(container, dict):
+        if nullable:
+            container[key] = None
+            return True
+        return False
+
+    if kind in ("enum", "literal_error"):
+        matches = [c for c in _choices(annotation) if _normalize(c) == _normalize(value)]
+        if len(matches) == 1:
+            container[key] = matches[0]
+            return True
+        return False
+
+    if kind == "list_type":
+        if value is None:
+            container[key] = []
+            return True
+        if isinstance(value, str):
+            container[key] = [value]
+            return True
+        return False
+
+    if value is None and isinstance(key, int) and isinstance(container, list):
+        if annotation is str:
+            removals.append((id(container), container, key))
+            return True
+        return False
+
+    if nullable and isinstance(value, str) and value.strip().lower() in ("", "null", "none"):
+        container[key] = None
+        return True
+
+    return False
+
+
+def _wrap_list(data, model_cls):
+    # A bare list answering a single-list schema, e.g. [...] for {"changes": [...]}
+    if isinstance(data, list):
+        list_fields = [
+            name for name, field in model_cls.model_fields.items()
+            if _is_list(field.annotation)
+        ]
+        if len(list_fields) == 1:
+            return {list_fields[0]: data}
+
+    return data
+
+
+def coerce_to_model(data, model_cls, max_passes: int = 3):
+    """
+    Fix what can be fixed locally. Returns (data, errors) where errors
+    is the list of remaining pydantic errors (empty when valid).
+    """
+    data = _wrap_list(json.loads(json.dumps(data)), model_cls)
+    errors = []
+
+    for _ in range(max_passes):
+        try:
+            model_cls.model_validate(data)
+            return data, []
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+
+        removals = []
+        fixed = [_fix(data, error, model_cls, removals) for error in errors]
+
+        # Remove list entries back to front so indices stay valid
+        for _, container, index in sorted(removals, key=lambda r: (r[0], -r[2])):
+            del container[index]
+
+        if not any(fixed):
+            break
+
+    try:
+        model_cls.model_validate(data)
+        return data, []
+    except ValidationError as e:
+        return data, e.errors(include_url=False)
+
+
+def split_item_errors(errors: list, model_cls):
+    """
+    If every error lies inside items of one list-of-models field,
+    return (field, {index: [messages]}); otherwise None.
+    """
+    field = None
+    items = {}
+
+    for error in errors:
+        loc = error["loc"]
+
+        if len(loc) < 2 or not isinstance(loc[1], int):
+            return None
+
+        annotation, _ = _annotation_at(model_cls, loc[:2])
+        if not (isinstance(annotation, type) and issubclass(annotation, BaseModel)):
+            return None
+
+        if field not in (None, loc[0]):
+            return None
+
+        field = loc[0]
+        path = ".".join(str(p) for p in loc[2:]) or "item"
+        items.setdefault(loc[1], []).append(f"{path}: {error['msg']}")
+
+    return (field, items) if field is not None else None
+
+
+def format_errors(errors: list) -> str:
+    return "\n".join(
+        f"{'.'.join(str(p) for p in e['loc']) or 'response'}: {e['msg']}"
+        for e in errors
+    )
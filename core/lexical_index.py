@@ -0,0 +1,220 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+import numpy as np
+from core import config
+from .chunking import chunk_text
+from .rag_index import source_signature, iter_documents
+
+
+# ============================================================
+# Offline BM25 retrieval
+#
+# Postings are kept per term as {doc_id: term_frequency} and turned
+# into NumPy arrays the first time a term is queried after a change,
+# so scoring a query is a handful of vectorized array operations.
+# Documents can be added and removed one at a time, which lets the
+# tenant corpus be updated per changed file instead of rebuilt.
+# ============================================================
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list:
+    # Lowercase and fold accents so "validación" matches "validacion"
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return TOKEN_RE.findall(folded)
+
+
+class BM25Index:
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self.vocab = {}  # term -> term id
+        self.postings = []  # term id -> {doc_id: tf}
+        self.documents = {}  # doc_id -> payload
+        self.doc_terms = {}  # doc_id -> term ids
+
+        self._next_id = 0
+        self._total_len = 0
+        self._doc_len = np.zeros(0, dtype="float32")
+        self._arrays = {}  # term id -> (doc_ids, tfs), invalidated on change
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, text: str, payload) -> int:
+        doc_id = self._next_id
+        self._next_id += 1
+
+        counts = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                term_id = len(self.postings)
+                self.vocab[token] = term_id
+                self.postings.append({})
+            counts[term_id] = counts.get(term_id, 0) + 1
+
+        for term_id, tf in counts.items():
+            self.postings[term_id][doc_id] = tf
+            self._arrays.pop(term_id, None)
+
+        if doc_id >= len(self._doc_len):
+            grown = np.zeros(max(64, 2 * len(self._doc_len)), dtype="float32")
+            grown[:len(self._doc_len)] = self._doc_len
+            self._doc_len = grown
+
+        self._doc_len[doc_id] = len(tokens)
+        self._total_len += len(tokens)
+
+        self.documents[doc_id] = payload
+        self.doc_terms[doc_id] = list(counts)
+
+        return doc_id
+
+    def remove(self, doc_id: int):
+        if doc_id not in self.documents:
+            return
+
+        for term_id in self.doc_terms.pop(doc_id):
+            self.postings[term_id].pop(doc_id, None)
+            self._arrays.pop(term_id, None)
+
+        self._total_len -= int(self._doc_len[doc_id])
+        self._doc_len[doc_id] = 0
+        del self.documents[doc_id]
+
+    def _term_arrays(self, term_id: int):
+        arrays = self._arrays.get(term_id)
+
+        if arrays is None:
+            posting = self.postings[term_id]
+            arrays = (
+                np.fromiter(posting.keys(), dtype="int64", count=len(posting)),
+                np.fromiter(posting.values(), dtype="float32", count=len(posting))
+            )
+            self._arrays[term_id] = arrays
+
+        return arrays
+
+    def search(self, query: str, top_k: int) -> list:
+        """
+        Return [(payload, score)] for the best top_k documents.
+        """
+        n_docs = len(self.documents)
+        if not n_docs:
+            return []
+
+        avg_len = self._total_len / n_docs or 1.0
+        scores = np.zeros(self._next_id, dtype="float32")
+
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None or not self.postings[term_id]:
+                continue
+
+            doc_ids, tfs = self._term_arrays(term_id)
+            df = len(doc_ids)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+            norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_ids] / avg_len)
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[best]
+
+        ranked = candidates[np.argsort(-scores[candidates])]
+
+        return [(self.documents[i], float(scores[i])) for i in ranked]
+
+
+# ============================================================
+# Tenant corpus
+# ============================================================
+
+class LexicalCorpus:
+    """
+    BM25 index over the chunks of a tenant rag folder, updated per
+    changed file.
+    """
+
+    def __init__(self, rag_path: str):
+        self.rag_path = rag_path
+        self.index = BM25Index()
+        self.signature = ()
+        self.files = {}  # file -> (sha256, [doc_id, ...])
+
+    def refresh(self, signature: tuple):
+        seen = set()
+
+        for file, content, sha in iter_documents(self.rag_path, [f for f, _, _ in signature]):
+            seen.add(file)
+
+            current = self.files.get(file)
+            if current is not None and current[0] == sha:
+                continue
+
+            if current is not None:
+                for doc_id in current[1]:
+                    self.index.remove(doc_id)
+
+            doc_ids = [
+                self.index.add(text, {
+                    "source": file,
+                    "start": start,
+                    "end": end,
+                    "text": text
+                })
+                for start, end, text in chunk_text(
+                    content, config.RAG_CHUNK_SIZE, config.RAG_CHUNK_OVERLAP
+                )
+            ]
+            self.files[file] = (sha, doc_ids)
+
+        for file in list(self.files):
+            if file not in seen:
+                for doc_id in self.files.pop(file)[1]:
+                    self.index.remove(doc_id)
+
+        self.signature = signature
+
+    def search(self, query: str, top_k: int) -> list:
+        return [
+            dict(payload, score=score)
+            for payload, score in self.index.search(query, top_k)
+        ]
+
+
+def get_lexical_index(rag_path: str) -> LexicalCorpus:
+    key = os.path.abspath(rag_path)
+    signature = source_signature(key)
+
+    corpus = _indexes.get(key)
+    if corpus is not None and corpus.signature == signature:
+        return corpus
+
+    with _lock:
+        corpus = _indexes.get(key)
+        if corpus is None:
+            corpus = LexicalCorpus(key)
+            _indexes[key] = corpus
+
+        if corpus.signature != signature:
+            corpus.refresh(signature)
+
+        return corpus
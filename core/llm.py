@@ -1,56 +1,166 @@
 import os
 import json
-from openai import OpenAI
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-
-def call_llm(prompt: dict):
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        temperature=0,
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "UpdatePlan",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "changes": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "action": {
-                                        "type": "string",
-                                        "enum": [
-                                            "create_feature",
-                                            "delete_feature",
-                                            "create_scenario",
-                                            "delete_scenario",
-                                            "update_step"
-                                        ]
-                                    },
-                                    "screen": {"type": "string"},
-                                    "feature": {"type": "string"},
-                                    "scenario": {"type": ["string", "null"]},
-                                    "step_index": {"type": ["integer", "null"]},
-                                    "old_value": {"type": ["string", "null"]},
-                                    "new_value": {"type": ["string", "null"]}
-                                },
-                                "required": ["action", "screen", "feature"]
-                            }
-                        }
-                    },
-                    "required": ["changes"]
+import asyncio
+import weakref
+from openai import OpenAI, AsyncOpenAI
+from core import config
+from core.llm_cache import get_llm_cache, request_key
+from core.token_budget import estimate_tokens
+from core.retry_policy import call_with_backoff, call_with_backoff_sync
+from core.json_repair import parse_model_json
+
+MODEL = "gpt-4o-mini"
+
+UPDATE_PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "UpdatePlan",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "changes": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "action": {
+                                "type": "string",
+                                "enum": [
+                                    "create_feature",
+                                    "delete_feature",
+                                    "create_scenario",
+                                    "delete_scenario",
+                                    "update_step"
+                                ]
+                            },
+                            "screen": {"type": "string"},
+                            "feature": {"type": "string"},
+                            "scenario": {"type": ["string", "null"]},
+                            "step_index": {"type": ["integer", "null"]},
+                            "old_value": {"type": ["string", "null"]},
+                            "new_value": {"type": ["string", "null"]}
+                        },
+                        "required": ["action", "screen", "feature"]
+                    }
                 }
-            }
-        },
-        messages=[
+            },
+            "required": ["changes"]
+        }
+    }
+}
+
+
+# ============================================================
+# Shared clients
+#
+# One pooled client per event loop (plus one sync client), reused
+# by every request. A global semaphore bounds concurrent calls.
+# ============================================================
+
+_client = None
+_loop_state = weakref.WeakKeyDictionary()  # loop -> (AsyncOpenAI, Semaphore)
+
+
+def _client_kwargs() -> dict:
+    return {
+        "api_key": os.environ.get("OPENAI_API_KEY"),
+        "base_url": config.LLM_BASE_URL,
+        "timeout": config.LLM_TIMEOUT_SECONDS,
+        # Retries are handled by core.retry_policy against the shared budget
+        "max_retries": 0
+    }
+
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(**_client_kwargs())
+    return _client
+
+
+def _get_loop_state():
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+
+    if state is None:
+        state = (
+            AsyncOpenAI(**_client_kwargs()),
+            asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+        )
+        _loop_state[loop] = state
+
+    return state
+
+
+def reset_clients():
+    """
+    Drop the shared clients so the next call picks up a new API key.
+    """
+    global _client
+    _client = None
+    _loop_state.clear()
+
+
+def _request_tokens(request: dict) -> int:
+    return estimate_tokens("".join(m["content"] for m in request["messages"]))
+
+
+def _build_request(prompt: dict) -> dict:
+    return {
+        "model": MODEL,
+        "temperature": 0,
+        "response_format": UPDATE_PLAN_RESPONSE_FORMAT,
+        "messages": [
             {"role": "system", "content": prompt["system"]},
             {"role": "user", "content": json.dumps(prompt["data"])}
         ]
+    }
+
+
+# ============================================================
+# Response cache
+# ============================================================
+
+def _cached_response(request: dict, use_cache: bool):
+    if not (use_cache and config.LLM_CACHE_ENABLED):
+        return None
+
+    response = get_llm_cache().get(request_key(request))
+
+    if response is not None:
+        print("[LLM CACHE] Hit")
+
+    return response
+
+
+def _store_response(request: dict, response, use_cache: bool):
+    if use_cache and config.LLM_CACHE_ENABLED:
+        get_llm_cache().put(request_key(request), response)
+
+
+def discard_cached_response(prompt: dict):
+    """
+    Forget the cached answer to prompt, e.g. when it failed validation,
+    so the next identical request reaches the model again.
+    """
+    get_llm_cache().discard(request_key(_build_request(prompt)))
+
+
+# ============================================================
+# Calls
+# ============================================================
+
+def call_llm(prompt: dict, use_cache: bool = True):
+
+    request = _build_request(prompt)
+
+    cached = _cached_response(request, use_cache)
+    if cached is not None:
+        return cached
+
+    response = call_with_backoff_sync(
+        lambda: get_client().chat.completions.create(**request),
+        _request_tokens(request)
     )
 
     content = response.choices[0].message.content
@@ -58,4 +168,66 @@ def call_llm(prompt: dict):
     # Debug log (opcional pero recomendado)
     print("LLM RAW RESPONSE:", content)
 
-    return json.loads(content)
+    result = parse_model_json(content)
+    _store_response(request, result, use_cache)
+
+    return result
+
+
+async def acall_llm(prompt: dict, timeout: float = None, use_cache: bool = True):
+    """
+    Non-blocking call_llm: awaits the shared pooled client under the
+    global concurrency limit. use_cache=False bypasses the response cache.
+    """
+    request = _build_request(prompt)
+
+    cached = _cached_response(request, use_cache)
+    if cached is not None:
+        return cached
+
+    client, semaphore = _get_loop_state()
+
+    async def create():
+        async with semaphore:
+            return await client.chat.completions.create(
+                **request,
+                timeout=timeout or config.LLM_TIMEOUT_SECONDS
+            )
+
+    response = await call_with_backoff(create, _request_tokens(request))
+
+    content = response.choices[0].message.content
+
+    print("LLM RAW RESPONSE:", content)
+
+    result = parse_model_json(content)
+    _store_response(request, result, use_cache)
+
+    return result
+
+
+def create_embeddings(texts: list, model: str) -> list:
+    response = call_with_backoff_sync(
+        lambda: get_client().embeddings.create(model=model, input=texts),
+        estimate_tokens("".join(texts))
+    )
+
+    return [e.embedding for e in response.data]
+
+
+async def acreate_embeddings(texts: list, model: str, timeout: float = None) -> list:
+    client, semaphore = _get_loop_state()
+
+    async def create():
+        async with semaphore:
+            return await client.embeddings.create(
+                model=model,
+                input=texts,
+                timeout=timeout or config.LLM_TIMEOUT_SECONDS
+            )
+
+    response = await call_with_backoff(
+        create, estimate_tokens("".join(texts))
+    )
+
+    return [e.embedding for e in response.data]
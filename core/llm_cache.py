@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from core import config
+
+
+# ============================================================
+# Deterministic LLM response cache
+#
+# Every completion runs at temperature 0 with a fixed model, so the
+# same request yields the same answer. Responses are stored as one
+# JSON file per request under:
+#
+#   <CACHE_DIR>/llm/ab/cdef....json  -> {"created": ts, "response": ...}
+#
+# Keys are sha256 of the canonical request (model, response schema,
+# system prompt and serialized payload). Entries expire after
+# LLM_CACHE_TTL_SECONDS; past LLM_CACHE_MAX_ENTRIES the least
+# recently used ones are evicted.
+# ============================================================
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def request_key(request: dict) -> str:
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+
+    def __init__(self, directory: str, ttl_seconds: float, max_entries: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> created, least recent first
+
+        self._load()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:] + ".json")
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+
+        found = []
+
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+
+            for item in os.scandir(prefix.path):
+                if not item.name.endswith(".json"):
+                    continue
+
+                # Files are written once: mtime is the creation time
+                key = prefix.name + item.name[:-len(".json")]
+                found.append((item.stat().st_mtime, key))
+
+        # Recency is tracked in memory; after a restart, oldest first
+        for created, key in sorted(found):
+            self._entries[key] = created
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    # --------------------------------------------------------
+    # Lookup / store
+    # --------------------------------------------------------
+
+    def get(self, key: str):
+        """
+        Return the cached response for key, or None.
+        """
+        with self._lock:
+            created = self._entries.get(key)
+
+            if created is None or self._expired(created):
+                if created is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return data["response"]
+
+    def put(self, key: str, response):
+        path = self._path(key)
+        created = time.time()
+
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "response": response}, f)
+            os.replace(tmp_path, path)
+
+            self._entries[key] = created
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def discard(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            for key in list(self._entries):
+                self._remove(key)
+            return removed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": config.LLM_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                os.path.join(config.CACHE_DIR, "llm"),
+                config.LLM_CACHE_TTL_SECONDS,
+                config.LLM_CACHE_MAX_ENTRIES
+            )
+
+        return _cache
+
+
+def llm_cache_stats() -> dict:
+    return get_llm_cache().stats()
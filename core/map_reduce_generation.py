@@ -0,0 +1,117 @@
+import asyncio
+from core import config
+from .document_sections import split_sections, join_sections
+
+
+# ============================================================
+# Map-reduce initial generation
+#
+# A long document is split into sections and packed into batches
+# of at most INITIAL_GENERATION_BATCH_CHARS. Every batch gets its
+# own initial generation (map), at most INITIAL_GENERATION_CONCURRENCY
+# at a time; the features are then merged (reduce) by screen and
+# feature group, and scenarios by name, first occurrence winning.
+# ============================================================
+
+
+def batch_sections(sections: list, max_chars: int) -> list:
+    """
+    Pack consecutive sections into batches of at most max_chars.
+    """
+    batches = []
+    current, size = [], 0
+
+    for section in sections:
+        length = len(section.render())
+
+        if current and size + length > max_chars:
+            batches.append(current)
+            current, size = [], 0
+
+        current.append(section)
+        size += length
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def _key(value: str) -> str:
+    return " ".join((value or "").lower().replace("_", " ").split())
+
+
+def _file_key(feature: dict) -> tuple:
+    # apply_initial_generation names files after feature_name
+    return _key(feature["screen_name"]), feature["feature_name"].lower().replace(" ", "_")
+
+
+def merge_generations(generations: list) -> dict:
+    """
+    Merge InitialGeneration payloads into one, deduplicating features
+    by (screen, feature group) or target file, and scenarios by name.
+    """
+    features = []
+    by_group = {}
+    by_file = {}
+    summary = []
+
+    for generation in generations:
+        for feature in generation["features"]:
+            group_key = (_key(feature["screen_name"]), _key(feature["feature_group"]))
+            merged = by_group.get(group_key) or by_file.get(_file_key(feature))
+
+            if merged is None:
+                merged = dict(feature, scenarios=[])
+                features.append(merged)
+
+            by_group.setdefault(group_key, merged)
+            by_file.setdefault(_file_key(feature), merged)
+
+            names = {_key(s["name"]) for s in merged["scenarios"]}
+            for scenario in feature["scenarios"]:
+                if _key(scenario["name"]) not in names:
+                    merged["scenarios"].append(scenario)
+                    names.add(_key(scenario["name"]))
+
+        for line in generation.get("change_summary", []):
+            if line not in summary:
+                summary.append(line)
+
+    return {"features": features, "change_summary": summary}
+
+
+def use_map_reduce(existing_structure: list, new_document: str) -> bool:
+    return not existing_structure and len(new_document) > config.INITIAL_GENERATION_BATCH_CHARS
+
+
+async def run_map_reduce(new_document: str, generate):
+    """
+    generate(document) must return an InitialGeneration payload, or
+    None when the batch produced nothing. Returns (merged payload,
+    batch reports).
+    """
+    batches = batch_sections(
+        split_sections(new_document), config.INITIAL_GENERATION_BATCH_CHARS
+    )
+    semaphore = asyncio.Semaphore(config.INITIAL_GENERATION_CONCURRENCY)
+
+    async def map_batch(batch):
+        async with semaphore:
+            return await generate(join_sections(batch))
+
+    print(f"[MAP-REDUCE] Generating {len(batches)} batch(es)")
+
+    results = await asyncio.gather(*[map_batch(batch) for batch in batches])
+
+    merged = merge_generations([r for r in results if r is not None])
+
+    reports = [
+        {
+            "sections": [section.title for section in batch],
+            "features": len(result["features"]) if result is not None else 0
+        }
+        for batch, result in zip(batches, results)
+    ]
+
+    return merged, reports
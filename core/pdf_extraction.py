@@ -0,0 +1,306 @@
+import os
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+from core import config
+from .text_cache import TextFileCache
+
+
+# ============================================================
+# PDF extraction
+#
+# Pages are extracted in batches on a process pool (spawned once,
+# QA_PDF_EXTRACT_WORKERS processes) and yielded as they finish;
+# small selections are extracted inline. Page text is cached on
+# disk by a digest of the page itself: its content stream, its form
+# XObjects and its whole font objects (encodings, ToUnicode maps and
+# font programs decide what the glyphs read as). A re-upload with a
+# few edited pages only re-extracts those pages:
+#
+#   <CACHE_DIR>/pdf_pages/ab/cdef....txt   (QA_PDF_PAGE_CACHE_MAX_BYTES)
+# ============================================================
+
+PAGE_CACHE_DIRNAME = "pdf_pages"
+BATCH_PAGES = 8
+MAX_XOBJECT_DEPTH = 3
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PageRangeError(ValueError):
+    pass
+
+
+class PageLimitError(PageRangeError):
+
+    def __init__(self, selected: int, limit: int):
+        super().__init__(
+            f"{selected} pages selected, more than the limit of {limit} "
+            f"(QA_PDF_MAX_PAGES); select fewer pages with ?pages="
+        )
+        self.selected = selected
+        self.limit = limit
+
+
+def parse_page_ranges(spec: str, page_count: int) -> list:
+    """
+    "1-3,7,10-" (1-based, inclusive; open ends allowed) -> sorted
+    0-based page indexes. An empty spec selects every page.
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    pages = set()
+
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+
+        start, dash, end = part.partition("-")
+
+        try:
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else page_count) if dash else first
+        except ValueError:
+            raise PageRangeError(f"Invalid page range: {part}")
+
+        if first < 1 or last < first:
+            raise PageRangeError(f"Invalid page range: {part}")
+
+        pages.update(range(first - 1, min(last, page_count)))
+
+    return sorted(pages)
+
+
+# ============================================================
+# Page digests
+# ============================================================
+
+def _hash_object(digest, obj, seen: set):
+    """
+    Feed a PDF object tree into digest: dictionaries by sorted key,
+    streams with their decoded data, indirect objects once each.
+    """
+    if isinstance(obj, IndirectObject):
+        if obj.idnum in seen:
+            digest.update(f"\0@{obj.idnum}".encode("utf-8"))
+            return
+        seen.add(obj.idnum)
+        obj = obj.get_object()
+
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"\0<<")
+        for key in sorted(obj.keys()):
+            if key == "/Parent":
+                continue
+            digest.update(f"\0{key}".encode("utf-8"))
+            _hash_object(digest, obj.raw_get(key), seen)
+        digest.update(b"\0>>")
+
+        if isinstance(obj, StreamObject):
+            digest.update(obj.get_data())
+
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"\0[")
+        for item in obj:
+            _hash_object(digest, item, seen)
+        digest.update(b"\0]")
+
+    else:
+        digest.update(f"\0{obj!r}".encode("utf-8"))
+
+
+def _font_digest(font, fonts: dict) -> str:
+    # Glyph-to-text mapping lives in /Encoding, /ToUnicode and the
+    # embedded font program, so the whole font object is hashed
+    key = font.idnum if isinstance(font, IndirectObject) else None
+
+    if key is not None and key in fonts:
+        return fonts[key]
+
+    digest = hashlib.sha256()
+    _hash_object(digest, font, set())
+
+    if key is not None:
+        fonts[key] = digest.hexdigest()
+
+    return digest.hexdigest()
+
+
+def _hash_resources(digest, resources, depth: int, fonts: dict):
+    if resources is None:
+        return
+
+    resources = resources.get_object()
+
+    font_dict = resources.get("/Font")
+    if font_dict is not None:
+        font_dict = font_dict.get_object()
+        for name in sorted(font_dict.keys()):
+            digest.update(f"\0{name}={_font_digest(font_dict.raw_get(name), fonts)}".encode("utf-8"))
+
+    # Text drawn through form XObjects is not in the page stream itself
+    xobjects = resources.get("/XObject")
+    if xobjects is None or depth >= MAX_XOBJECT_DEPTH:
+        return
+
+    for name, xobject in sorted(xobjects.get_object().items()):
+        xobject = xobject.get_object()
+        if xobject.get("/Subtype") != "/Form":
+            continue
+
+        digest.update(f"\0{name}:".encode("utf-8"))
+        digest.update(xobject.get_data())
+        _hash_resources(digest, xobject.get("/Resources"), depth + 1, fonts)
+
+
+def page_digest(page, fonts: dict = None) -> str:
+    """
+    fonts memoizes font digests by object number within one document.
+    """
+    digest = hashlib.sha256()
+
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    _hash_resources(digest, page.get("/Resources"), 0, {} if fonts is None else fonts)
+
+    return digest.hexdigest()
+
+
+# ============================================================
+# Page text cache
+# ============================================================
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> TextFileCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = TextFileCache(
+                os.path.join(config.CACHE_DIR, PAGE_CACHE_DIRNAME),
+                config.PDF_PAGE_CACHE_MAX_BYTES
+            )
+
+    return _cache
+
+
+def pdf_extraction_stats() -> dict:
+    return dict(get_page_cache().stats(), workers=config.PDF_EXTRACT_WORKERS)
+
+
+# ============================================================
+# Extraction
+# ============================================================
+
+def _extract_pages(path: str, indexes: list) -> list:
+    # Runs in a pool process: one reader per batch of pages
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text() or "") for i in indexes]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the server process has threads, fork would copy their locks
+            _pool = ProcessPoolExecutor(
+                max_workers=config.PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _extract(path: str, reader: PdfReader, indexes: list):
+    if len(indexes) < config.PDF_PARALLEL_MIN_PAGES or config.PDF_EXTRACT_WORKERS <= 1:
+        for i in indexes:
+            yield i, reader.pages[i].extract_text() or ""
+        return
+
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_pages, path, indexes[start:start + BATCH_PAGES])
+        for start in range(0, len(indexes), BATCH_PAGES)
+    ]
+
+    done = set()
+
+    try:
+        for future in as_completed(futures):
+            for i, text in future.result():
+                done.add(i)
+                yield i, text
+
+    except BrokenProcessPool:
+        # A worker died: start a fresh pool next time, finish inline
+        print("[PDF] Extraction pool broke, extracting the remaining pages inline")
+        _reset_pool()
+
+        for i in indexes:
+            if i not in done:
+                yield i, reader.pages[i].extract_text() or ""
+
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_pdf_pages(path: str, pages: str = None, max_pages: int = None):
+    """
+    Yield (0-based page index, text) for the selected pages as they
+    become available: cached pages first, then extracted pages in
+    completion order. max_pages defaults to QA_PDF_MAX_PAGES (0 = all);
+    a larger selection raises PageLimitError instead of being cut.
+    """
+    reader = PdfReader(path)
+    indexes = parse_page_ranges(pages, len(reader.pages))
+
+    limit = config.PDF_MAX_PAGES if max_pages is None else max_pages
+    if limit and len(indexes) > limit:
+        raise PageLimitError(len(indexes), limit)
+
+    cache = get_page_cache()
+    digests = {}
+    missing = []
+    fonts = {}
+
+    for i in indexes:
+        digests[i] = page_digest(reader.pages[i], fonts)
+
+        text = cache.get(digests[i])
+        if text is None:
+            missing.append(i)
+        else:
+            yield i, text
+
+    for i, text in _extract(path, reader, missing):
+        cache.put(digests[i], text)
+        yield i, text
+
+
+def read_pdf(path: str, pages: str = None, max_pages: int = None) -> str:
+    texts = dict(iter_pdf_pages(path, pages, max_pages))
+
+    return "\n".join(texts[i] for i in sorted(texts) if texts[i]).strip()
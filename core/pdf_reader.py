@@ -1,13 +1,5 @@
+from core.pdf_extraction import read_pdf
 
-from pypdf import PdfReader
 
 def extract_text_from_pdf(file_path: str) -> str:
-    reader = PdfReader(file_path)
-    text = ""
-
-    for page in reader.pages:
-        content = page.extract_text()
-        if content:
-            text += content + "\n"
-
-    return text.strip()
+    return read_pdf(file_path)
@@ -0,0 +1,125 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from core import config
+from core.suite_index import get_suite_index
+from core.atomic_writer import write_files_atomic
+from core.history import get_history_store
+from core.document_versions import get_document_store
+
+
+# ============================================================
+# Two-phase plans
+#
+# A dry run stores the files it would write together with the
+# sha256 of every touched file as it was read (None = did not
+# exist). Applying the plan re-checks those hashes against the
+# suite index and writes the precomputed content directly, or
+# fails with a conflict if any touched file changed meanwhile.
+# A plan computed from a named document records that document as
+# its last synced version once applied.
+# ============================================================
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+_commit_lock = threading.Lock()
+
+
+class PlanNotFoundError(Exception):
+    pass
+
+
+class PlanConflictError(Exception):
+
+    def __init__(self, conflicts: list):
+        super().__init__(f"Suite changed since the dry run: {', '.join(conflicts)}")
+        self.conflicts = conflicts
+
+
+class PlanRecord:
+
+    def __init__(self, plan_id: str, kind: str, base_dir: str, payload: dict,
+                 files: dict, base_versions: dict, document: dict = None):
+        self.plan_id = plan_id
+        self.kind = kind  # apply_update_plan | initial_generation
+        self.base_dir = base_dir
+        self.payload = payload
+        self.files = files  # path -> content to write
+        self.base_versions = base_versions  # path -> sha256 | None
+        self.document = document  # {identity, text} | None
+        self.created = time.time()
+
+
+def _evict_expired():
+    cutoff = time.time() - config.PLAN_TTL_SECONDS
+
+    for plan_id in [p for p, r in _plans.items() if r.created < cutoff]:
+        del _plans[plan_id]
+
+    while len(_plans) > config.PLAN_MAX_ENTRIES:
+        _plans.popitem(last=False)
+
+
+def store_plan(kind: str, base_dir: str, payload: dict, files: dict,
+               base_versions: dict, document: dict = None) -> str:
+    plan_id = uuid.uuid4().hex
+
+    with _plans_lock:
+        _plans[plan_id] = PlanRecord(
+            plan_id, kind, base_dir, payload, files, base_versions, document
+        )
+        _evict_expired()
+
+    return plan_id
+
+
+def get_plan(plan_id: str) -> PlanRecord:
+    with _plans_lock:
+        _evict_expired()
+        record = _plans.get(plan_id)
+
+    if record is None:
+        raise PlanNotFoundError(f"Unknown or expired plan: {plan_id}")
+
+    return record
+
+
+def commit_plan(plan_id: str) -> PlanRecord:
+    """
+    Write the precomputed files of a dry run if none of the files it
+    touched changed since it was computed (optimistic concurrency).
+    """
+    record = get_plan(plan_id)
+
+    with _commit_lock:
+        entries = get_suite_index(record.base_dir).refresh()
+
+        conflicts = []
+        for path, sha in record.base_versions.items():
+            entry = entries.get(path)
+            current = entry.sha256 if entry is not None else None
+            if current != sha:
+                conflicts.append(path)
+
+        if conflicts:
+            raise PlanConflictError(sorted(conflicts))
+
+        write_files_atomic(record.files)
+
+        if record.files:
+            get_history_store(record.base_dir).record(
+                {path: entry.text for path, entry in entries.items()},
+                record.files,
+                record.kind
+            )
+
+        if record.document is not None:
+            get_document_store(record.base_dir).put(
+                record.document["identity"], record.document["text"]
+            )
+
+    with _plans_lock:
+        _plans.pop(plan_id, None)
+
+    return record
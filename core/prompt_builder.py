@@ -1,9 +1,35 @@
-from .rag import retrieve_context
+import os
+import threading
+from .rag import aretrieve_context
 
-def build_prompt(story: dict) -> dict:
-    system_prompt = open("tenants/default/system_prompt.txt").read()
+_prompts = {}  # path -> (mtime, text)
+_prompts_lock = threading.Lock()
 
-    rag_context = retrieve_context(
+
+def read_system_prompt(path: str) -> str:
+    """
+    Read a prompt file once; it is re-read only when its mtime changes.
+    """
+    mtime = os.stat(path).st_mtime_ns
+
+    with _prompts_lock:
+        cached = _prompts.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    with _prompts_lock:
+        _prompts[path] = (mtime, text)
+
+    return text
+
+
+async def build_prompt(story: dict) -> dict:
+    system_prompt = read_system_prompt("tenants/default/system_prompt.txt")
+
+    rag_context = await aretrieve_context(
         query=story["title"] + " " + story["description"],
         rag_path="tenants/default/rag"
     )
@@ -20,7 +46,7 @@ CONTEXTO DEL PROYECTO:
     }
 
 def build_analyze_prompt(story: dict) -> dict:
-    system_prompt = open("tenants/default/system_prompt_analyze.txt").read()
+    system_prompt = read_system_prompt("tenants/default/system_prompt_analyze.txt")
 
     return {
         "system": system_prompt,
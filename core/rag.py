@@ -1,22 +1,22 @@
-import os
-import faiss
+import asyncio
 import numpy as np
-from openai import OpenAI
+from core import config
+from .llm import create_embeddings, acreate_embeddings
+from .rag_index import get_rag_index
+from .lexical_index import get_lexical_index
+from .embedding_cache import get_embedding_cache
 
-client = OpenAI()
+EMBEDDING_MODEL = "text-embedding-3-small"
 
-def load_documents(rag_path: str):
-    docs = []
-    for file in os.listdir(rag_path):
-        if file.endswith(".md"):
-            with open(os.path.join(rag_path, file), encoding="utf-8") as f:
-                content = f.read().strip()
-                if content:
-                    docs.append(content[:4000])  # límite defensivo
-    return docs
+# Hybrid mode pulls this many times top_k candidates from each backend
+HYBRID_CANDIDATES_FACTOR = 4
 
 
-def embed_texts(texts):
+# ============================================================
+# Embeddings
+# ============================================================
+
+def _clean_texts(texts) -> list:
     # Filtramos textos vacíos o inválidos
     clean_texts = [
         t.strip() for t in texts
@@ -26,22 +26,165 @@ def embed_texts(texts):
     if not clean_texts:
         raise ValueError("No valid texts to embed for RAG")
 
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=clean_texts
-    )
+    return clean_texts
+
+
+def _lookup_cached(clean_texts: list):
+    # Only texts never seen for this model reach the endpoint
+    cache = get_embedding_cache(EMBEDDING_MODEL)
+    found, missing = cache.lookup(clean_texts)
+    pending = list(dict.fromkeys(clean_texts[i] for i in missing))
+    return cache, found, missing, pending
+
+
+def _merge_embedded(clean_texts, cache, found, missing, pending, vectors):
+    if missing:
+        embedded = np.array(vectors).astype("float32")
+        cache.store(pending, embedded)
+
+        by_text = dict(zip(pending, embedded))
+        for i in missing:
+            found[i] = by_text[clean_texts[i]]
+
+    return np.array([found[i] for i in range(len(clean_texts))]).astype("float32")
+
+
+def embed_texts(texts):
+    clean_texts = _clean_texts(texts)
+    cache, found, missing, pending = _lookup_cached(clean_texts)
+
+    vectors = None
+    if missing:
+        vectors = create_embeddings(pending, EMBEDDING_MODEL)
+
+    return _merge_embedded(clean_texts, cache, found, missing, pending, vectors)
+
+
+async def aembed_texts(texts):
+    clean_texts = _clean_texts(texts)
+    cache, found, missing, pending = _lookup_cached(clean_texts)
+
+    vectors = None
+    if missing:
+        vectors = await acreate_embeddings(pending, EMBEDDING_MODEL)
+
+    return _merge_embedded(clean_texts, cache, found, missing, pending, vectors)
+
+
+# ============================================================
+# Retrieval backends
+# ============================================================
+
+BACKENDS = ("embedding", "bm25", "hybrid")
+
+
+def _embedding_results(rag_index, query_embedding, top_k: int) -> list:
+    chunks = rag_index.search(query_embedding, top_k)
+
+    for chunk in chunks:
+        chunk["score"] = 1.0 / (1.0 + chunk["distance"])
+
+    return chunks
+
+
+def _normalize_scores(chunks: list) -> dict:
+    if not chunks:
+        return {}
 
-    return np.array([e.embedding for e in response.data]).astype("float32")
+    scores = [c["score"] for c in chunks]
+    low, high = min(scores), max(scores)
+    span = (high - low) or 1.0
 
+    return {
+        (c["source"], c["start"]): (c["score"] - low) / span if high > low else 1.0
+        for c in chunks
+    }
 
-def retrieve_context(query: str, rag_path: str, top_k=3):
-    docs = load_documents(rag_path)
-    embeddings = embed_texts(docs)
 
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+def _hybrid_merge(lexical: list, semantic: list, top_k: int) -> list:
+    alpha = config.RAG_HYBRID_ALPHA
 
+    lexical_scores = _normalize_scores(lexical)
+    semantic_scores = _normalize_scores(semantic)
+
+    merged = {}
+    for chunk in lexical + semantic:
+        key = (chunk["source"], chunk["start"])
+        if key not in merged:
+            merged[key] = {
+                "source": chunk["source"],
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "text": chunk["text"],
+                "score": (
+                    alpha * lexical_scores.get(key, 0.0)
+                    + (1 - alpha) * semantic_scores.get(key, 0.0)
+                )
+            }
+
+    return sorted(merged.values(), key=lambda c: -c["score"])[:top_k]
+
+
+def _resolve_backend(backend: str) -> str:
+    backend = backend or config.RAG_BACKEND
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown RAG backend: {backend}")
+
+    return backend
+
+
+def _rank(backend, query, rag_path, top_k, rag_index=None, query_embedding=None):
+    if backend == "bm25":
+        return get_lexical_index(rag_path).search(query, top_k)
+
+    if backend == "embedding":
+        return _embedding_results(rag_index, query_embedding, top_k)
+
+    candidates = top_k * HYBRID_CANDIDATES_FACTOR
+    return _hybrid_merge(
+        get_lexical_index(rag_path).search(query, candidates),
+        _embedding_results(rag_index, query_embedding, candidates),
+        top_k
+    )
+
+
+def retrieve_chunks(query: str, rag_path: str, top_k=3, backend: str = None) -> list:
+    """
+    Return the top_k chunks as dicts with source, start, end, text and score.
+    """
+    backend = _resolve_backend(backend)
+
+    if backend == "bm25":
+        return _rank(backend, query, rag_path, top_k)
+
+    # Shared persistent index: only changed documents are re-embedded
+    rag_index = get_rag_index(rag_path, embed_fn=embed_texts)
     query_embedding = embed_texts([query[:1000]])
-    _, indices = index.search(query_embedding, top_k)
 
-    return "\n\n".join(docs[i] for i in indices[0])
+    return _rank(backend, query, rag_path, top_k, rag_index, query_embedding)
+
+
+async def aretrieve_chunks(query: str, rag_path: str, top_k=3, backend: str = None) -> list:
+    backend = _resolve_backend(backend)
+
+    if backend == "bm25":
+        return _rank(backend, query, rag_path, top_k)
+
+    # Index refreshes are rare and disk-bound: keep them off the event loop
+    rag_index = await asyncio.to_thread(get_rag_index, rag_path, embed_texts)
+    query_embedding = await aembed_texts([query[:1000]])
+
+    return _rank(backend, query, rag_path, top_k, rag_index, query_embedding)
+
+
+def retrieve_context(query: str, rag_path: str, top_k=3, backend: str = None):
+    chunks = retrieve_chunks(query, rag_path, top_k, backend)
+
+    return "\n\n".join(c["text"] for c in chunks)
+
+
+async def aretrieve_context(query: str, rag_path: str, top_k=3, backend: str = None):
+    chunks = await aretrieve_chunks(query, rag_path, top_k, backend)
+
+    return "\n\n".join(c["text"] for c in chunks)
@@ -0,0 +1,334 @@
+import os
+import json
+import hashlib
+import threading
+import faiss
+import numpy as np
+from core import config
+from .chunking import chunk_text
+
+
+# ============================================================
+# Persistent per-tenant RAG index
+#
+# Layout (inside tenants/<tenant>/rag):
+#
+#   .index/manifest.json  -> one entry per document + content hash,
+#                            with the (start, end, row) of its chunks
+#   .index/vectors.npy    -> float32 embeddings, one row per chunk
+#   .index/index.faiss    -> faiss index built from vectors.npy
+#
+# Documents are streamed one at a time, split into overlapping
+# chunks and embedded in size-bounded batches. Only documents whose
+# content hash changed are re-chunked and re-embedded. Past
+# RAG_ANN_THRESHOLD chunks the flat L2 index is replaced by HNSW.
+# The faiss index is memory-mapped on load and shared by every
+# request of the process until a .md file changes on disk.
+# ============================================================
+
+INDEX_DIRNAME = ".index"
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+FAISS_FILE = "index.faiss"
+
+HNSW_NEIGHBORS = 32
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+class RagIndex:
+
+    def __init__(self, rag_path: str, chunks: list, index, signature: tuple):
+        self.rag_path = rag_path
+        self.chunks = chunks  # (file, start, end), one per faiss row
+        self.index = index
+        self.signature = signature
+
+    def search(self, query_embedding, top_k: int) -> list:
+        if not self.chunks:
+            return []
+
+        distances, indices = self.index.search(query_embedding, top_k)
+
+        results = []
+        sources = {}
+
+        for distance, i in zip(distances[0], indices[0]):
+            if i < 0:
+                continue
+
+            file, start, end = self.chunks[i]
+
+            if file not in sources:
+                sources[file] = _read_source(self.rag_path, file)
+
+            results.append({
+                "source": file,
+                "start": start,
+                "end": end,
+                "text": sources[file][start:end],
+                "distance": float(distance)
+            })
+
+        return results
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_source(rag_path: str, file: str) -> str:
+    with open(os.path.join(rag_path, file), encoding="utf-8") as f:
+        return f.read()
+
+
+def source_signature(rag_path: str) -> tuple:
+    """
+    Cheap stat-only fingerprint of the .md files in rag_path.
+    """
+    entries = []
+
+    for file in sorted(os.listdir(rag_path)):
+        if file.endswith(".md"):
+            st = os.stat(os.path.join(rag_path, file))
+            entries.append((file, st.st_mtime_ns, st.st_size))
+
+    return tuple(entries)
+
+
+def _chunk_params() -> dict:
+    return {
+        "chunk_size": config.RAG_CHUNK_SIZE,
+        "chunk_overlap": config.RAG_CHUNK_OVERLAP
+    }
+
+
+def iter_documents(rag_path: str, files):
+    """
+    Stream (file, content, sha256) for every non-empty document.
+    """
+    for file in files:
+        content = _read_source(rag_path, file)
+
+        if content.strip():
+            yield file, content, _content_hash(content)
+
+
+def _load_manifest(index_dir: str) -> dict:
+    path = os.path.join(index_dir, MANIFEST_FILE)
+
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_vectors(index_dir: str):
+    path = os.path.join(index_dir, VECTORS_FILE)
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: str, write_fn, mode: str = "wb"):
+    tmp_path = path + ".tmp"
+
+    encoding = None if "b" in mode else "utf-8"
+    with open(tmp_path, mode, encoding=encoding) as f:
+        write_fn(f)
+
+    os.replace(tmp_path, path)
+
+
+def _read_faiss(path: str):
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def _build_faiss(vectors):
+    dim = vectors.shape[1]
+
+    if len(vectors) >= config.RAG_ANN_THRESHOLD:
+        index = faiss.IndexHNSWFlat(dim, HNSW_NEIGHBORS)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    index.add(vectors)
+    return index
+
+
+# ============================================================
+# Batched embedding
+# ============================================================
+
+class _EmbeddingBatcher:
+    """
+    Collects chunk texts and embeds them in batches bounded by
+    RAG_EMBED_BATCH_SIZE items and RAG_EMBED_BATCH_CHARS characters.
+    """
+
+    def __init__(self, embed_fn):
+        self.embed_fn = embed_fn
+        self.pending = []  # (slot, text)
+        self.pending_chars = 0
+        self.results = {}  # slot -> vector
+
+    def add(self, slot: int, text: str):
+        if self.pending and (
+            len(self.pending) >= config.RAG_EMBED_BATCH_SIZE
+            or self.pending_chars + len(text) > config.RAG_EMBED_BATCH_CHARS
+        ):
+            self.flush()
+
+        self.pending.append((slot, text))
+        self.pending_chars += len(text)
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        embeddings = self.embed_fn([text for _, text in self.pending])
+
+        for (slot, _), vector in zip(self.pending, embeddings):
+            self.results[slot] = vector
+
+        self.pending = []
+        self.pending_chars = 0
+
+
+# ============================================================
+# Build / refresh
+# ============================================================
+
+def _sync_index(rag_path: str, signature: tuple, embed_fn) -> RagIndex:
+
+    index_dir = os.path.join(rag_path, INDEX_DIRNAME)
+    faiss_path = os.path.join(index_dir, FAISS_FILE)
+
+    manifest = _load_manifest(index_dir)
+    old_vectors = _load_vectors(index_dir)
+
+    old_files = {}
+    if old_vectors is not None and manifest.get("params") == _chunk_params():
+        old_files = {entry["file"]: entry for entry in manifest.get("files", [])}
+
+    files = []
+    chunks = []
+    sources = []  # per chunk: old row (int) or None when it must be embedded
+    batcher = _EmbeddingBatcher(embed_fn)
+    embedded_docs = 0
+
+    for file, content, sha in iter_documents(rag_path, [f for f, _, _ in signature]):
+
+        old = old_files.get(file)
+        entry = {"file": file, "sha256": sha, "chunks": []}
+
+        if old is not None and old["sha256"] == sha:
+            spans = [(start, end, row) for start, end, row in old["chunks"]]
+        else:
+            embedded_docs += 1
+            spans = []
+            for start, end, text in chunk_text(
+                content, config.RAG_CHUNK_SIZE, config.RAG_CHUNK_OVERLAP
+            ):
+                batcher.add(len(chunks) + len(spans), text)
+                spans.append((start, end, None))
+
+        for start, end, row in spans:
+            entry["chunks"].append([start, end, len(chunks)])
+            chunks.append((file, start, end))
+            sources.append(row)
+
+        files.append(entry)
+
+    batcher.flush()
+
+    if not chunks:
+        raise ValueError("No valid texts to embed for RAG")
+
+    unchanged = (
+        not embedded_docs
+        and sources == list(range(len(old_vectors)))
+        and os.path.exists(faiss_path)
+    )
+
+    if unchanged:
+        return RagIndex(rag_path, chunks, _read_faiss(faiss_path), signature)
+
+    print(
+        f"[RAG] Re-embedded {embedded_docs}/{len(files)} documents "
+        f"({len(batcher.results)}/{len(chunks)} chunks) in {rag_path}"
+    )
+
+    sample = next(iter(batcher.results.values()), None)
+    dim = len(sample) if sample is not None else old_vectors.shape[1]
+    vectors = np.empty((len(chunks), dim), dtype="float32")
+
+    for slot, row in enumerate(sources):
+        vectors[slot] = old_vectors[row] if row is not None else batcher.results[slot]
+
+    index = _build_faiss(vectors)
+
+    os.makedirs(index_dir, exist_ok=True)
+
+    _write_atomic(
+        os.path.join(index_dir, VECTORS_FILE),
+        lambda f: np.save(f, vectors)
+    )
+    _write_atomic(
+        faiss_path,
+        lambda f: f.write(faiss.serialize_index(index).tobytes())
+    )
+
+    manifest = {
+        "dimension": dim,
+        "params": _chunk_params(),
+        "files": files
+    }
+
+    _write_atomic(
+        os.path.join(index_dir, MANIFEST_FILE),
+        lambda f: json.dump(manifest, f, indent=2),
+        mode="w"
+    )
+
+    return RagIndex(rag_path, chunks, _read_faiss(faiss_path), signature)
+
+
+def get_rag_index(rag_path: str, embed_fn) -> RagIndex:
+    """
+    Return the shared index for rag_path, refreshing it only when
+    the .md files changed since it was loaded.
+    """
+    key = os.path.abspath(rag_path)
+    signature = source_signature(key)
+
+    cached = _indexes.get(key)
+    if cached is not None and cached.signature == signature:
+        return cached
+
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached.signature == signature:
+            return cached
+
+        rag_index = _sync_index(key, signature, embed_fn)
+        _indexes[key] = rag_index
+
+        return rag_index
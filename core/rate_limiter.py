@@ -0,0 +1,125 @@
+import time
+import asyncio
+import threading
+from core import config
+
+
+# ============================================================
+# Process-wide LLM rate limiter
+#
+# Two token buckets (requests per minute and tokens per minute)
+# shared by every model call in the process, sync or async. A call
+# reserves its budget up front and sleeps until the buckets cover
+# it, so concurrent callers queue in arrival order instead of all
+# hitting the endpoint and collecting 429s. A rate-limit answer
+# with a retry-after hint pauses every caller until it expires.
+# ============================================================
+
+
+class TokenBucket:
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take amount from the bucket (the level may go negative) and
+        return how long the caller must wait before using it.
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+        self.level -= min(amount, self.capacity)
+
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+        self.calls = 0
+        self.delayed = 0
+        self.waited_seconds = 0.0
+        self.pauses = 0
+
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+
+            delay = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self._cooldown_until - now
+            )
+
+            self.calls += 1
+            if delay > 0:
+                self.delayed += 1
+                self.waited_seconds += delay
+
+            return delay
+
+    async def acquire(self, tokens: int):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, tokens: int):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """
+        Hold back every caller for seconds (server retry-after hint).
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._cooldown_until:
+                self._cooldown_until = until
+                self.pauses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "calls": self.calls,
+                "delayed": self.delayed,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "pauses": self.pauses,
+                "paused_for": round(
+                    max(0.0, self._cooldown_until - time.monotonic()), 3
+                )
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                config.LLM_REQUESTS_PER_MINUTE,
+                config.LLM_TOKENS_PER_MINUTE
+            )
+
+        return _limiter
@@ -1,40 +1,139 @@
-from pydantic import ValidationError
 import copy
+from .llm import discard_cached_response
+from .retry_policy import classify_error, get_retry_stats, INVALID
+from .json_repair import coerce_to_model, split_item_errors, format_errors
 
 
-def retry_with_correction(prompt, call_fn, response_model, max_retries=2):
+def _full_correction(base_prompt: dict, errors: str) -> dict:
+    # Build corrected prompt without stacking infinite system text
+    prompt = copy.deepcopy(base_prompt)
+
+    prompt["system"] += f"""
+
+The previous response did NOT comply with the required schema.
+Validation errors:
+{errors}
+
+Return ONLY valid JSON matching the required schema.
+"""
+    return prompt
+
+
+def _item_correction(base_prompt: dict, field: str, data: dict, items: dict) -> dict:
+    prompt = copy.deepcopy(base_prompt)
+
+    prompt["system"] += f"""
+
+Some items of "{field}" in the previous response did NOT comply with the required schema.
+They are listed in "invalid_items" with their validation errors.
+Return ONLY valid JSON of the form {{"{field}": [...]}} containing exactly
+{len(items)} corrected item(s), in the same order. Do not repeat any other item.
+"""
+    prompt["data"] = dict(
+        prompt["data"],
+        invalid_items=[
+            {"item": data[field][index], "errors": errors}
+            for index, errors in sorted(items.items())
+        ]
+    )
+    return prompt
+
+
+async def _repair_items(base_prompt, call_fn, field, data, items) -> dict:
+    """
+    Re-prompt for the invalid items only and put the answers back in
+    place. Items the model did not return stay as they were.
+    """
+    prompt = _item_correction(base_prompt, field, data, items)
+    print(f"[QA-AGENT] Re-prompting for {len(items)} invalid item(s) of {field}")
+
+    try:
+        answer = await call_fn(prompt)
+    except Exception as e:
+        if classify_error(e) != INVALID:
+            raise
+        return data
+
+    if isinstance(answer, dict):
+        answer = answer.get(field)
+
+    if not isinstance(answer, list):
+        discard_cached_response(prompt)
+        return data
+
+    merged = copy.deepcopy(data)
+    for index, item in zip(sorted(items), answer):
+        merged[field][index] = item
+
+    return merged
+
+
+async def retry_with_correction(prompt, call_fn, response_model, max_retries=2, result=None,
+                                error: Exception = None):
+    """
+    Validate a model answer, repairing it locally first.
+
+    Fixable enum/null mismatches are coerced without a round-trip. If
+    only some items of a list are invalid, only those are re-prompted;
+    otherwise the whole prompt is re-sent with the validation errors.
+    Pass result to validate an answer the caller already has, or
+    error for one it could not parse (the first attempt re-prompts).
+
+    Rate-limit and transient errors are already retried with backoff
+    inside call_fn (core.retry_policy); anything that still escapes is
+    not the model's fault and is raised instead of re-prompting.
+    """
     last_error = None
 
     # Avoid mutating original prompt
     base_prompt = copy.deepcopy(prompt)
 
+    if error is not None:
+        get_retry_stats().record_error(INVALID)
+        last_error = str(error)
+        prompt = _full_correction(base_prompt, last_error)
+        result = None
+
     for attempt in range(max_retries + 1):
         print(f"[QA-AGENT] Retry attempt {attempt + 1}")
 
-        result = call_fn(prompt)
+        if result is None:
+            try:
+                result = await call_fn(prompt)
+            except Exception as e:
+                if classify_error(e) != INVALID:
+                    raise
 
-        try:
-            # Validate dynamically using provided schema
-            validated = response_model.model_validate(result)
+                get_retry_stats().record_error(INVALID)
+                last_error = str(e)
+                prompt = _full_correction(base_prompt, last_error)
+                continue
+
+        data, errors = coerce_to_model(result, response_model)
+
+        if not errors:
+            validated = response_model.model_validate(data)
 
             # Ensure proper JSON serialization (enums, etc.)
             return validated.model_dump(mode="json")
 
-        except ValidationError as e:
-            last_error = str(e)
+        get_retry_stats().record_error(INVALID)
+        last_error = format_errors(errors)
 
-            # Build corrected prompt without stacking infinite system text
-            prompt = copy.deepcopy(base_prompt)
+        if attempt == max_retries:
+            break
 
-            prompt["system"] += f"""
+        items = split_item_errors(errors, response_model)
 
-The previous response did NOT comply with the required schema.
-Validation errors:
-{last_error}
-
-Return ONLY valid JSON matching the required schema.
-"""
+        if items is not None:
+            field, invalid = items
+            result = await _repair_items(base_prompt, call_fn, field, data, invalid)
+        else:
+            # Never serve an invalid answer from the response cache again
+            discard_cached_response(prompt)
+            prompt = _full_correction(base_prompt, last_error)
+            result = None
 
     raise ValueError(
         f"Invalid output after {max_retries + 1} attempts: {last_error}"
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,192 @@
+import time
+import json
+import random
+import asyncio
+import threading
+import openai
+from pydantic import ValidationError
+from core import config
+from core.rate_limiter import get_rate_limiter
+
+
+# ============================================================
+# Retry policy for model calls
+#
+# Errors are classified before deciding what to do:
+#
+#   rate_limit -> back off (retry-after hint when given) and pause
+#                 every caller through the shared rate limiter
+#   transient  -> timeouts, connection errors, 5xx: exponential
+#                 backoff with full jitter
+#   invalid    -> the answer is not valid JSON / fails the schema:
+#                 re-prompt with a correction (retry_with_correction)
+#   fatal      -> anything else (auth, bad request): raise at once
+# ============================================================
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+INVALID = "invalid"
+FATAL = "fatal"
+
+ERROR_CLASSES = (RATE_LIMIT, TRANSIENT, INVALID, FATAL)
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return TRANSIENT
+
+    if isinstance(error, openai.APIStatusError) and error.status_code in (408, 409):
+        return TRANSIENT
+
+    if isinstance(error, (ValidationError, json.JSONDecodeError)):
+        return INVALID
+
+    return FATAL
+
+
+def retry_after_seconds(error: Exception):
+    """
+    Server hint from retry-after-ms / retry-after headers, if any.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full jitter: uniform in [0, min(max, base * 2**attempt)].
+    """
+    ceiling = min(
+        config.LLM_BACKOFF_MAX_SECONDS,
+        config.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)
+    )
+    return random.uniform(0, ceiling)
+
+
+class RetryStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.backoff_seconds = 0.0
+        self.errors = dict.fromkeys(ERROR_CLASSES, 0)
+
+        self._lock = threading.Lock()
+
+    def record_error(self, kind: str):
+        with self._lock:
+            self.errors[kind] += 1
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def record_retry(self, delay: float):
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += delay
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "errors": dict(self.errors)
+            }
+
+
+_stats = RetryStats()
+
+
+def get_retry_stats() -> RetryStats:
+    return _stats
+
+
+def _next_delay(error: Exception, attempt: int):
+    """
+    Return the delay before the next attempt, or None to give up.
+    """
+    kind = classify_error(error)
+    _stats.record_error(kind)
+
+    if kind not in (RATE_LIMIT, TRANSIENT) or attempt >= config.LLM_MAX_RETRIES:
+        _stats.record_failure()
+        return None
+
+    delay = backoff_delay(attempt)
+
+    if kind == RATE_LIMIT:
+        hint = retry_after_seconds(error)
+        if hint is not None:
+            delay = min(hint, config.LLM_BACKOFF_MAX_SECONDS)
+        get_rate_limiter().pause(delay)
+
+    _stats.record_retry(delay)
+    print(f"[LLM RETRY] {kind} error, attempt {attempt + 1}, retrying in {delay:.2f}s")
+
+    return delay
+
+
+async def call_with_backoff(fn, tokens: int):
+    """
+    Await fn() within the shared rate budget, retrying rate-limit and
+    transient errors with backoff. Other errors propagate unchanged.
+    """
+    limiter = get_rate_limiter()
+    attempt = 0
+
+    while True:
+        await limiter.acquire(tokens)
+        _stats.record_call()
+
+        try:
+            return await fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt)
+            if delay is None:
+                raise
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def call_with_backoff_sync(fn, tokens: int):
+    limiter = get_rate_limiter()
+    attempt = 0
+
+    while True:
+        limiter.acquire_sync(tokens)
+        _stats.record_call()
+
+        try:
+            return fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt)
+            if delay is None:
+                raise
+
+        time.sleep(delay)
+        attempt += 1
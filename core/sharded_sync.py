@@ -0,0 +1,234 @@
+import asyncio
+from core import config
+from .lexical_index import BM25Index
+from .document_sections import split_sections, join_sections
+from .document_versions import REVISION_HEADER
+
+
+# ============================================================
+# Sharded sync
+#
+# Large suites are synced one screen directory at a time. Document
+# sections are routed with BM25 to the screens they talk about
+# (every screen within SYNC_SHARD_ROUTE_RATIO of the best match);
+# each shard sees only its own features and sections, and the
+# shard syncs run concurrently. Sections that match no screen go
+# to one general shard that sees the whole (relevance-pruned) suite.
+# A document revision header is not routed: every shard gets it.
+# The resulting change lists are merged; changes from different
+# shards that hit the same target differently are reported as
+# conflicts instead of being applied.
+# ============================================================
+
+GENERAL_SHARD = "*"
+
+FEATURE_ACTIONS = ("create_feature", "delete_feature")
+
+
+class Shard:
+
+    __slots__ = ("screen", "structure", "sections")
+
+    def __init__(self, screen: str, structure: list):
+        self.screen = screen
+        self.structure = structure
+        self.sections = []
+
+
+def partition_by_screen(existing_structure: list) -> list:
+    shards = {}
+
+    for feature in existing_structure:
+        screen = feature.get("screen", "")
+        shards.setdefault(screen, Shard(screen, [])).structure.append(feature)
+
+    return list(shards.values())
+
+
+def _shard_text(shard: Shard) -> str:
+    parts = [shard.screen]
+
+    for feature in shard.structure:
+        parts.append(feature["feature"])
+        parts.extend(s["name"] for s in feature["scenarios"])
+
+    return "\n".join(parts)
+
+
+def route_sections(sections: list, shards: list) -> list:
+    """
+    Append every section to the shards it is relevant to and return
+    the sections no shard matched.
+    """
+    index = BM25Index()
+    for position, shard in enumerate(shards):
+        index.add(_shard_text(shard), position)
+
+    by_title = {shard.screen.lower(): shard for shard in shards if shard.screen}
+    unrouted = []
+
+    for section in sections:
+        # A section titled after a screen belongs to that screen
+        named = by_title.get(section.title.strip().lower())
+        if named is not None:
+            named.sections.append(section)
+            continue
+
+        ranked = index.search(section.render(), len(shards))
+        if not ranked:
+            unrouted.append(section)
+            continue
+
+        cutoff = ranked[0][1] * config.SYNC_SHARD_ROUTE_RATIO
+        for position, score in ranked:
+            if score >= cutoff:
+                shards[position].sections.append(section)
+
+    return unrouted
+
+
+# ============================================================
+# Merge
+# ============================================================
+
+def _norm(value) -> str:
+    return (value or "").strip().lower()
+
+
+def _target(change: dict) -> tuple:
+    feature_key = (_norm(change.get("screen")), _norm(change.get("feature")))
+    action = change.get("action")
+
+    if action in FEATURE_ACTIONS:
+        return feature_key, (action,)
+
+    if action == "update_step":
+        step = change.get("step_index")
+        return feature_key, (
+            action, _norm(change.get("scenario")),
+            step if step is not None else _norm(change.get("old_value"))
+        )
+
+    return feature_key, (action, _norm(change.get("scenario")))
+
+
+def merge_plans(plans: list):
+    """
+    plans -> [(shard label, [change dicts])]
+
+    Return (changes, conflicts). Identical changes are kept once; a
+    change hitting a target another shard already changed differently,
+    or a feature another shard creates/deletes, becomes a conflict.
+    """
+    merged = []
+    conflicts = []
+
+    targets = {}  # (feature key, target) -> (label, change)
+    touched = {}  # feature key -> labels
+    feature_owner = {}  # feature key -> label of a create/delete_feature
+
+    def conflict(label, change, other, reason):
+        conflicts.append({
+            "shard": label,
+            "conflicts_with": other,
+            "change": change,
+            "reason": reason
+        })
+
+    for label, changes in plans:
+        for change in changes:
+            feature_key, target = _target(change)
+            key = (feature_key, target)
+
+            previous = targets.get(key)
+            if previous is not None:
+                if previous[1] == change:
+                    continue
+                if previous[0] != label:
+                    conflict(label, change, previous[0], "same target changed differently")
+                    continue
+
+            others = touched.get(feature_key, set()) - {label}
+            owner = feature_owner.get(feature_key)
+
+            if change.get("action") in FEATURE_ACTIONS and others:
+                conflict(label, change, sorted(others)[0], "feature also changed by another shard")
+                continue
+
+            if owner is not None and owner != label:
+                conflict(label, change, owner, "feature created or deleted by another shard")
+                continue
+
+            targets[key] = (label, change)
+            touched.setdefault(feature_key, set()).add(label)
+            if change.get("action") in FEATURE_ACTIONS:
+                feature_owner[feature_key] = label
+
+            merged.append(change)
+
+    return merged, conflicts
+
+
+# ============================================================
+# Run
+# ============================================================
+
+def use_shards(existing_structure: list, sharded: bool = None) -> bool:
+    screens = {feature.get("screen", "") for feature in existing_structure}
+
+    if sharded is not None:
+        return sharded and len(screens) > 1
+
+    threshold = config.SYNC_SHARD_MIN_SCENARIOS
+    scenarios = sum(len(f["scenarios"]) for f in existing_structure)
+
+    return threshold > 0 and scenarios >= threshold and len(screens) > 1
+
+
+async def run_shards(existing_structure: list, new_document: str, request_plan):
+    """
+    Sync every shard that received sections, concurrently.
+
+    request_plan(structure, document) must return the validated
+    UpdatePlan payload and the prompt report of one sync call.
+    Returns (merged changes, conflicts, shard reports).
+    """
+    header = ""
+    if new_document.startswith(REVISION_HEADER):
+        header = REVISION_HEADER + "\n\n"
+        new_document = new_document[len(REVISION_HEADER):]
+
+    shards = partition_by_screen(existing_structure)
+    unrouted = route_sections(split_sections(new_document), shards)
+
+    jobs = [
+        (shard.screen, shard.structure, shard.sections)
+        for shard in shards if shard.sections
+    ]
+
+    if unrouted:
+        jobs.append((GENERAL_SHARD, existing_structure, unrouted))
+
+    print(f"[SHARDED SYNC] {len(jobs)} shard(s) for {len(shards)} screen(s)")
+
+    results = await asyncio.gather(*[
+        request_plan(structure, header + join_sections(sections))
+        for _, structure, sections in jobs
+    ])
+
+    changes, conflicts = merge_plans([
+        (label, payload["changes"])
+        for (label, _, _), (payload, _) in zip(jobs, results)
+    ])
+
+    reports = [
+        {
+            "screen": label,
+            "sections": [section.title for section in sections],
+            "changes": len(payload["changes"]),
+            "prompt": report
+        }
+        for (label, _, sections), (payload, report) in zip(jobs, results)
+    ]
+
+    return changes, conflicts, reports
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import json
+
+
+# ============================================================
+# Single-flight request coalescing
+#
+# Concurrent identical requests (same endpoint, document and suite
+# version) attach to the one pending computation instead of each
+# building a prompt and calling the model. Every caller receives
+# the same result or the same exception. Nothing is kept once the
+# computation finishes: repeated requests are served by the LLM
+# response cache.
+# ============================================================
+
+
+def flight_key(endpoint: str, document, suite_version: str = None) -> tuple:
+    """
+    document may be bytes, a string or any JSON-serializable value.
+    """
+    if isinstance(document, str):
+        document = document.encode("utf-8")
+    elif not isinstance(document, bytes):
+        document = json.dumps(document, sort_keys=True).encode("utf-8")
+
+    return (endpoint, hashlib.sha256(document).hexdigest(), suite_version)
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+
+        self._pending = {}  # key -> asyncio.Task
+
+    async def do(self, key, fn):
+        """
+        Await fn() once per key among concurrent callers.
+        """
+        task = self._pending.get(key)
+
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.followers += 1
+            print(f"[SINGLE FLIGHT] Joined pending {key[0]} request")
+        else:
+            task = asyncio.ensure_future(fn())
+            self._pending[key] = task
+            self.leaders += 1
+            task.add_done_callback(lambda t: self._release(key, t))
+
+        # A caller that disconnects must not cancel the shared work
+        return await asyncio.shield(task)
+
+    def _release(self, key, task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+        # Mark the exception as retrieved when every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._pending),
+            "executed": self.leaders,
+            "coalesced": self.followers
+        }
+
+
+_flights = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _flights
@@ -0,0 +1,197 @@
+import re
+from collections import Counter
+from .gherkin import STEP_KEYWORDS
+
+
+# ============================================================
+# Step vocabulary for prompts
+#
+# Suites repeat the same steps with different values. A step is
+# normalized to a template by replacing its literals (quoted
+# strings and numbers) with $1, $2, ...:
+#
+#   When the user enters "bob" in the "email" field
+#   -> template: the user enters $1 in the $2 field
+#   -> encoded:  When S3("bob", "email")
+#
+# Templates that save characters across the payload get a short
+# ID; the payload carries each template once. Encoded steps in
+# the model output are expanded back through the same table.
+# ============================================================
+
+# A single quote only delimits a literal at word boundaries, so
+# apostrophes ("I'm on the user's page") are left alone
+LITERAL_RE = re.compile(
+    r'"(?:[^"\\]|\\.)*"'
+    r"|(?<!\w)'(?:[^'\\]|\\.)*'(?!\w)"
+    r'|(?<![\w$])-?\d+(?:\.\d+)?(?![\w.])'
+)
+PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+
+_KEYWORDS = "|".join(re.escape(k) for k in STEP_KEYWORDS)
+ENCODED_RE = re.compile(rf"^(?:({_KEYWORDS})\s+)?(S\d+)(?:\((.*)\))?$")
+
+# Characters a vocabulary entry costs besides its template ("S12": "...",)
+ENTRY_OVERHEAD = 10
+
+
+def split_step(step: str):
+    """
+    Return (keyword, template, literals), or None for steps that
+    cannot be templated (no keyword, or text that looks like $n).
+    """
+    keyword, _, text = step.strip().partition(" ")
+
+    if keyword not in STEP_KEYWORDS or not text or PLACEHOLDER_RE.search(text):
+        return None
+
+    literals = []
+
+    def placeholder(match):
+        literals.append(match.group(0))
+        return f"${len(literals)}"
+
+    template = LITERAL_RE.sub(placeholder, text)
+    return keyword, template, literals
+
+
+class StepVocabulary:
+
+    def __init__(self, entries: dict = None):
+        self.entries = dict(entries or {})  # id -> template
+        self._ids = {template: step_id for step_id, template in self.entries.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, steps: list):
+        """
+        Assign IDs to the templates whose encoding saves characters,
+        most used first.
+        """
+        counts = Counter()
+        first_seen = {}
+
+        for step in steps:
+            parts = split_step(step)
+            if parts is None:
+                continue
+
+            template = parts[1]
+            counts[template] += 1
+            first_seen.setdefault(template, len(first_seen))
+
+        ranked = sorted(counts, key=lambda t: (-counts[t], first_seen[t]))
+
+        entries = {}
+        for template in ranked:
+            step_id = f"S{len(entries) + 1}"
+            saved = counts[template] * (len(template) - len(step_id) - 2)
+            if saved > len(template) + ENTRY_OVERHEAD:
+                entries[step_id] = template
+
+        return cls(entries)
+
+    # --------------------------------------------------------
+    # Encode / decode
+    # --------------------------------------------------------
+
+    def encode_step(self, step: str) -> str:
+        parts = split_step(step)
+        if parts is None:
+            return step
+
+        keyword, template, literals = parts
+        step_id = self._ids.get(template)
+        if step_id is None:
+            return step
+
+        if literals:
+            return f"{keyword} {step_id}({', '.join(literals)})"
+
+        return f"{keyword} {step_id}"
+
+    def decode_step(self, line: str) -> str:
+        """
+        Expand an encoded step; any other line is returned unchanged.
+        """
+        stripped = line.strip()
+        match = ENCODED_RE.match(stripped)
+        if match is None:
+            return line
+
+        keyword, step_id, args = match.groups()
+        template = self.entries.get(step_id)
+        if template is None:
+            return line
+
+        literals = LITERAL_RE.findall(args or "")
+        if len(literals) != len(PLACEHOLDER_RE.findall(template)):
+            return line
+
+        text = PLACEHOLDER_RE.sub(lambda m: literals[int(m.group(1)) - 1], template)
+        indent = line[:len(line) - len(line.lstrip())]
+
+        return f"{indent}{keyword} {text}" if keyword else f"{indent}{text}"
+
+    def decode_text(self, text):
+        if not isinstance(text, str) or not self.entries:
+            return text
+
+        return "\n".join(self.decode_step(line) for line in text.split("\n"))
+
+
+# ============================================================
+# Prompt helpers
+# ============================================================
+
+def _structure_steps(structure: list):
+    for feature in structure:
+        yield from feature.get("background", [])
+        for scenario in feature["scenarios"]:
+            yield from scenario.get("steps", [])
+
+
+def encode_structure(structure: list):
+    """
+    Return (encoded structure, vocabulary) for a prompt-ready structure.
+    """
+    vocabulary = StepVocabulary.build(list(_structure_steps(structure)))
+
+    if not vocabulary:
+        return structure, vocabulary
+
+    encoded = []
+    for feature in structure:
+        feature = dict(feature)
+
+        if "background" in feature:
+            feature["background"] = [vocabulary.encode_step(s) for s in feature["background"]]
+
+        feature["scenarios"] = [
+            dict(scenario, steps=[vocabulary.encode_step(s) for s in scenario["steps"]])
+            if "steps" in scenario else scenario
+            for scenario in feature["scenarios"]
+        ]
+        encoded.append(feature)
+
+    return encoded, vocabulary
+
+
+def decode_plan(plan: dict, vocabulary: StepVocabulary) -> dict:
+    """
+    Expand encoded steps in an UpdatePlan / InitialGeneration payload.
+    """
+    if not vocabulary:
+        return plan
+
+    for change in plan.get("changes", []):
+        for field in ("old_value", "new_value"):
+            change[field] = vocabulary.decode_text(change.get(field))
+
+    for feature in plan.get("features", []):
+        for scenario in feature.get("scenarios", []):
+            scenario["steps"] = [vocabulary.decode_text(s) for s in scenario["steps"]]
+
+    return plan
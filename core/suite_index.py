@@ -0,0 +1,153 @@
+import os
+import hashlib
+import threading
+from .gherkin import parse_feature, to_structure
+
+
+# ============================================================
+# Process-wide index of parsed .feature files
+#
+# Every entry point that needs the current suite (sync, apply,
+# test structure) reads it from here. A refresh is a stat pass
+# over the tree: only files whose mtime or size changed since
+# the last refresh are read and parsed again.
+# ============================================================
+
+# History stores (.qa_history) and legacy _history backups are never walked
+SKIPPED_DIR_PREFIXES = (".", "_history")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class FeatureFileEntry:
+
+    __slots__ = ("path", "mtime_ns", "size", "text", "sha256", "parsed")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, text: str):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.text = text
+        self.sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.parsed = parse_feature(text)
+
+
+class FeatureSuiteIndex:
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.entries = {}  # absolute path -> FeatureFileEntry
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        """
+        Yield (path, stat) for every .feature file under base_dir.
+        """
+        stack = [self.base_dir]
+
+        while stack:
+            current = stack.pop()
+
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(SKIPPED_DIR_PREFIXES):
+                                stack.append(entry.path)
+                        elif entry.name.endswith(".feature"):
+                            yield entry.path, entry.stat()
+            except FileNotFoundError:
+                continue
+
+    def _load(self, path: str) -> FeatureFileEntry:
+        with open(path, "r", encoding="utf-8") as f:
+            st = os.fstat(f.fileno())
+            text = f.read()
+
+        return FeatureFileEntry(path, st.st_mtime_ns, st.st_size, text)
+
+    def refresh(self) -> dict:
+        """
+        Revalidate the index against disk and return {path: entry},
+        sorted by path.
+        """
+        with self._lock:
+
+            if not os.path.exists(self.base_dir):
+                self.entries = {}
+                return {}
+
+            fresh = {}
+            reparsed = 0
+
+            for path, st in self._scan():
+                current = self.entries.get(path)
+
+                if (
+                    current is not None
+                    and current.mtime_ns == st.st_mtime_ns
+                    and current.size == st.st_size
+                ):
+                    fresh[path] = current
+                    continue
+
+                try:
+                    fresh[path] = self._load(path)
+                    reparsed += 1
+                except FileNotFoundError:
+                    continue
+
+            if reparsed:
+                print(f"[SUITE INDEX] Re-parsed {reparsed}/{len(fresh)} feature files")
+
+            self.entries = dict(sorted(fresh.items()))
+            return self.entries
+
+    # --------------------------------------------------------
+    # Views
+    # --------------------------------------------------------
+
+    def version(self) -> str:
+        """
+        Digest of the whole suite (paths and contents): equal digests
+        mean the same suite on disk.
+        """
+        digest = hashlib.sha256()
+
+        for path, entry in self.refresh().items():
+            digest.update(os.path.relpath(path, self.base_dir).encode("utf-8"))
+            digest.update(b"\0" + entry.sha256.encode("ascii") + b"\n")
+
+        return digest.hexdigest()
+
+    def read_map(self) -> dict:
+        return {path: entry.text for path, entry in self.refresh().items()}
+
+    def structure(self) -> list:
+        structured = []
+
+        for path, entry in self.refresh().items():
+            if entry.parsed.name:
+                item = to_structure(entry.parsed, os.path.basename(path))
+
+                # Screen folder, as used in change plans ("" at the root)
+                relative = os.path.relpath(os.path.dirname(path), self.base_dir)
+                item["screen"] = "" if relative == "." else relative.replace(os.sep, "/")
+
+                structured.append(item)
+
+        return structured
+
+
+def get_suite_index(base_dir: str) -> FeatureSuiteIndex:
+    key = os.path.abspath(base_dir)
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+
+        if index is None:
+            index = FeatureSuiteIndex(key)
+            _indexes[key] = index
+
+        return index
@@ -1,23 +1,178 @@
-import json
+from core import config
+from .lexical_index import BM25Index
+from .token_budget import estimate_tokens
+from .step_vocabulary import encode_structure
+from .prompt_builder import read_system_prompt
 
 
-def build_sync_prompt(current_tests: str, existing_structure: list, new_document: str) -> dict:
+# ============================================================
+# Relevance-pruned sync prompt
+#
+# The suite is sent once, as existing_structure. Every scenario is
+# scored against the new document with BM25; the relevant ones go
+# in with their steps (needed for update_step), best first, while
+# they fit in SYNC_PROMPT_TOKEN_BUDGET. All other scenarios are
+# listed by name only, so the model still knows they exist. When
+# even the names do not fit, features are listed without them.
+# Repeated steps are then encoded through a step vocabulary.
+# ============================================================
 
-    feature_names = [f["feature"] for f in existing_structure]
+VOCABULARY_INSTRUCTIONS = """
 
-    system_prompt = open(
-        "tenants/default/system_prompt.txt",
-        encoding="utf-8"
-    ).read()
+------------------------------------------------------------
+STEP VOCABULARY
+------------------------------------------------------------
+
+Repeated steps in existing_structure are written as
+<Keyword> S<n>(<arguments>), where step_vocabulary["S<n>"] is the step
+text and $1, $2, ... stand for the arguments in order.
+
+Example: with "S3": "the user enters $1 in the $2 field",
+When S3("bob", "email") means: When the user enters "bob" in the "email" field
+
+Prefer reusing existing steps. In old_value and new_value you may write
+steps either in full or in this notation; they are expanded before the
+plan is applied.
+"""
+
+
+def _outline(feature: dict, with_scenarios: bool = True) -> dict:
+    outline = {
+        "screen": feature.get("screen", ""),
+        "feature": feature["feature"],
+        "file": feature["file"],
+        "scenarios": []
+    }
+
+    if with_scenarios:
+        outline["scenarios"] = [{"name": s["name"]} for s in feature["scenarios"]]
+
+    return outline
+
+
+def _scenario_text(feature: dict, scenario: dict) -> str:
+    return "\n".join(
+        [feature["feature"], scenario["name"]] + scenario.get("steps", [])
+    )
+
+
+def score_scenarios(existing_structure: list, new_document: str) -> list:
+    """
+    Return [(score, feature position, scenario position)] for every
+    scenario the document is relevant to, best first.
+    """
+    index = BM25Index()
+
+    for f_pos, feature in enumerate(existing_structure):
+        for s_pos, scenario in enumerate(feature["scenarios"]):
+            index.add(_scenario_text(feature, scenario), (f_pos, s_pos))
+
+    ranked = index.search(new_document, len(index))
+    if not ranked:
+        return []
+
+    # Keep scenarios scoring close enough to the best match
+    cutoff = ranked[0][1] * config.SYNC_PROMPT_MIN_RELEVANCE
+
+    return [(score, f, s) for (f, s), score in ranked if score >= cutoff]
+
+
+def prune_structure(existing_structure: list, new_document: str, budget: int):
+    """
+    Return (structure, detailed scenario count) fitting budget tokens.
+    """
+    outlines = [_outline(feature) for feature in existing_structure]
+    with_names = estimate_tokens(outlines) <= budget
+
+    if not with_names:
+        outlines = [_outline(feature, False) for feature in existing_structure]
+
+    used = estimate_tokens(outlines)
+    detailed = 0
+
+    for _, f_pos, s_pos in score_scenarios(existing_structure, new_document):
+        feature = existing_structure[f_pos]
+        outline = outlines[f_pos]
+
+        extra = [feature["scenarios"][s_pos]]
+        if "background" in feature and "background" not in outline:
+            extra.append(feature["background"])
+
+        cost = estimate_tokens(extra)
+        if used + cost > budget:
+            continue
+
+        if "background" in feature:
+            outline["background"] = feature["background"]
+
+        if with_names:
+            outline["scenarios"][s_pos] = feature["scenarios"][s_pos]
+        else:
+            outline["scenarios"].append(feature["scenarios"][s_pos])
+
+        used += cost
+        detailed += 1
+
+    return outlines, detailed
+
+
+def build_sync_prompt(existing_structure: list, new_document: str,
+                      token_budget: int = None) -> dict:
+
+    token_budget = token_budget or config.SYNC_PROMPT_TOKEN_BUDGET
+
+    system_prompt = read_system_prompt("tenants/default/system_prompt.txt")
+
+    fixed = estimate_tokens(system_prompt) + estimate_tokens(new_document)
+
+    structure, detailed = prune_structure(
+        existing_structure, new_document, max(0, token_budget - fixed)
+    )
+
+    # Pruning budgets the plain steps; encode only when it pays off
+    encoded, vocabulary = encode_structure(structure)
+
+    if vocabulary and (
+        estimate_tokens(encoded) + estimate_tokens(vocabulary.entries)
+        + estimate_tokens(VOCABULARY_INSTRUCTIONS) < estimate_tokens(structure)
+    ):
+        structure = encoded
+    else:
+        vocabulary = None
 
     user_payload = {
-        "existing_feature_names": feature_names,
-        "existing_structure": existing_structure,
-        "current_test_suite": current_tests,
+        "existing_structure": structure,
         "new_functional_input": new_document
     }
 
+    if vocabulary:
+        system_prompt += VOCABULARY_INSTRUCTIONS
+        user_payload["step_vocabulary"] = vocabulary.entries
+
+    sections = {
+        "system": estimate_tokens(system_prompt),
+        "step_vocabulary": estimate_tokens(vocabulary.entries) if vocabulary else 0,
+        "existing_structure": estimate_tokens(structure),
+        "new_functional_input": estimate_tokens(new_document)
+    }
+    sections["total"] = sum(sections.values())
+
+    scenarios = sum(len(f["scenarios"]) for f in existing_structure)
+    print(
+        f"[SYNC PROMPT] ~{sections['total']} tokens (budget {token_budget}), "
+        f"{detailed}/{scenarios} scenarios in full: {sections}"
+    )
+
+    if sections["total"] > token_budget:
+        print("[SYNC PROMPT] Warning: over budget even with scenario details pruned")
+
     return {
         "system": system_prompt,
-        "data": user_payload
+        "data": user_payload,
+        "report": {
+            "token_budget": token_budget,
+            "sections": sections,
+            "scenarios_in_full": detailed,
+            "scenarios_total": scenarios
+        }
     }
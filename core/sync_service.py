@@ -0,0 +1,314 @@
+import os
+import asyncio
+import difflib
+from functools import partial
+from core import config
+from core.feature_structure import build_feature_structure
+from core.update_engine import execute_update_plan, read_all_features_map
+from core.initial_generation_engine import apply_initial_generation
+from core.llm import acall_llm, discard_cached_response
+from core.sync_prompt_builder import build_sync_prompt
+from core.schemas_tests import UpdatePlan
+from core.schemas_initial import InitialGeneration
+from core.history import content_hash
+from core.plan_store import store_plan
+from core.retry import retry_with_correction
+from core.retry_policy import classify_error, INVALID
+from core.step_vocabulary import StepVocabulary, decode_plan
+from core.sharded_sync import use_shards, run_shards
+from core.map_reduce_generation import use_map_reduce, run_map_reduce
+from core.document_versions import document_identity, get_document_store, revision_document
+
+
+class SyncError(Exception):
+    pass
+
+
+async def request_plan(existing_structure: list, new_document: str,
+                       use_cache: bool = True):
+    """
+    One model call: return (response model, validated payload, prompt).
+    """
+    prompt = None
+
+    try:
+
+        # ======================================================
+        # Build prompt (relevance-pruned, within the token budget)
+        # ======================================================
+        prompt = await asyncio.to_thread(
+            build_sync_prompt,
+            existing_structure=existing_structure,
+            new_document=new_document
+        )
+
+        # ======================================================
+        # Call LLM (RAW)
+        # ======================================================
+        parse_error = None
+
+        try:
+            raw_response = await acall_llm(prompt, use_cache=use_cache)
+        except Exception as e:
+            # JSON the local repair could not fix: re-prompted below
+            if classify_error(e) != INVALID:
+                raise
+            raw_response = None
+            parse_error = e
+
+        print("LLM RAW RESPONSE:", raw_response)
+
+        # ======================================================
+        # Detect response type, repair and validate
+        # ======================================================
+
+        if parse_error is not None:
+            # The mode the system prompt asks for
+            response_model = UpdatePlan if existing_structure else InitialGeneration
+        elif not isinstance(raw_response, dict):
+            raise SyncError(f"Unsupported LLM response type: {type(raw_response)}")
+        elif "features" in raw_response:
+            response_model = InitialGeneration
+        elif "changes" in raw_response:
+            response_model = UpdatePlan
+        else:
+            raise SyncError("Unknown response format from LLM")
+
+        # Fixable mismatches are coerced locally; only invalid items are re-prompted
+        repaired = await retry_with_correction(
+            prompt,
+            partial(acall_llm, use_cache=use_cache),
+            response_model,
+            result=raw_response,
+            error=parse_error
+        )
+
+        # Expand steps the model wrote in step-vocabulary notation
+        vocabulary = StepVocabulary(prompt["data"].get("step_vocabulary"))
+        payload = decode_plan(repaired, vocabulary)
+
+        response_model.model_validate(payload)
+
+        return response_model, payload, prompt
+
+    except Exception:
+        # A cached answer that failed here would fail again: drop it
+        if prompt is not None:
+            discard_cached_response(prompt)
+        raise
+
+
+def _read_suite(base_dir: str):
+    current_files = {
+        os.path.abspath(path): content
+        for path, content in read_all_features_map(base_dir).items()
+    }
+
+    return current_files, build_feature_structure(base_dir)
+
+
+def _store_dry_run(base_dir: str, current_files: dict, response_model, payload: dict,
+                   document: dict = None) -> dict:
+    """
+    Simulate payload against the suite, store it as a plan and return
+    {plan_id, result, diff, skipped}. document ({identity, text}) is
+    recorded as the last synced version when the plan is applied.
+    """
+    validated = response_model.model_validate(payload)
+
+    if response_model is InitialGeneration:
+
+        simulated_files_raw = apply_initial_generation(
+            validated.model_dump(),
+            simulate=True,
+            base_dir=base_dir
+        )
+
+        result_payload = validated.model_dump()
+        skipped_changes = []
+        plan_kind = "initial_generation"
+
+    else:
+
+        plan_result = execute_update_plan(validated.model_dump(mode="json"), base_dir)
+
+        simulated_files_raw = plan_result.files
+        result_payload = validated.model_dump()
+        skipped_changes = plan_result.skipped
+        plan_kind = "apply_update_plan"
+
+    simulated_files = {
+        os.path.abspath(path): content
+        for path, content in simulated_files_raw.items()
+    }
+
+    # ======================================================
+    # Build diff
+    # ======================================================
+    diff_by_file = {}
+
+    for path, new_content in simulated_files.items():
+
+        old_content = current_files.get(path)
+
+        if old_content is None:
+            diff = list(difflib.unified_diff(
+                [],
+                new_content.splitlines(),
+                lineterm=""
+            ))
+        else:
+            diff = list(difflib.unified_diff(
+                old_content.splitlines(),
+                new_content.splitlines(),
+                lineterm=""
+            ))
+
+        if diff:
+            file_key = os.path.relpath(path, base_dir)
+            diff_by_file[file_key] = diff
+
+    print("==== DIFF BY FILE ====")
+    print(diff_by_file)
+
+    # ======================================================
+    # Store dry run for /apply-proposed
+    # ======================================================
+    changed_files = {
+        path: content
+        for path, content in simulated_files.items()
+        if current_files.get(path) != content
+    }
+
+    base_versions = {
+        path: content_hash(current_files[path]) if path in current_files else None
+        for path in changed_files
+    }
+
+    plan_id = store_plan(
+        plan_kind,
+        base_dir,
+        result_payload,
+        changed_files,
+        base_versions,
+        document
+    )
+
+    return {
+        "plan_id": plan_id,
+        "result": result_payload,
+        "diff": diff_by_file,
+        "skipped": skipped_changes
+    }
+
+
+async def run_sync(new_document: str, base_dir: str = None, use_cache: bool = True,
+                   sharded: bool = None, document_id: str = None,
+                   full_document: bool = False) -> dict:
+    """
+    Dry-run a sync of new_document against the suite in base_dir.
+
+    Returns {plan_id, result, diff, skipped, ...}; the plan is stored
+    for /apply-proposed. sharded=None shards large suites by screen
+    automatically. With a document_id, only the sections changed since
+    the last applied version of that document are sent (unless
+    full_document). Raises SyncError when the model answer is unusable.
+    """
+    base_dir = base_dir or config.BASE_FEATURES_DIR
+
+    # Suite reads, prompt building and simulation are CPU and disk
+    # work: they run off the event loop like document extraction
+    current_files, existing_structure = await asyncio.to_thread(_read_suite, base_dir)
+
+    document = None
+    revision = None
+    sync_document = new_document
+
+    if document_id:
+        identity = document_identity(document_id)
+        document = {"identity": identity, "text": new_document}
+
+        previous = await asyncio.to_thread(get_document_store(base_dir).get, identity)
+
+        if previous is not None and existing_structure and not full_document:
+            sync_document, revision = await asyncio.to_thread(
+                revision_document, previous["text"], new_document
+            )
+            revision["identity"] = identity
+
+    if revision is not None and sync_document is None:
+        print(f"[DOCUMENT] {revision['identity']} unchanged since the last sync")
+        result = await asyncio.to_thread(
+            _store_dry_run, base_dir, current_files, UpdatePlan, {"changes": []}, document
+        )
+
+    elif use_shards(existing_structure, sharded):
+        result = await _run_sharded(base_dir, current_files, existing_structure,
+                                    sync_document, use_cache, document)
+
+    elif use_map_reduce(existing_structure, sync_document):
+        result = await _run_map_reduce(base_dir, current_files, sync_document,
+                                       use_cache, document)
+
+    else:
+        response_model, payload, prompt = await request_plan(
+            existing_structure, sync_document, use_cache
+        )
+
+        result = await asyncio.to_thread(
+            _store_dry_run, base_dir, current_files, response_model, payload, document
+        )
+        result["prompt"] = prompt["report"]
+
+    if revision is not None:
+        result["document"] = revision
+
+    return result
+
+
+async def _run_sharded(base_dir, current_files, existing_structure, new_document,
+                       use_cache, document=None):
+
+    async def shard_plan(structure, document):
+        response_model, payload, prompt = await request_plan(structure, document, use_cache)
+
+        if response_model is not UpdatePlan:
+            raise SyncError("A shard returned a full generation for an existing suite")
+
+        return payload, prompt["report"]
+
+    changes, conflicts, shards = await run_shards(
+        existing_structure, new_document, shard_plan
+    )
+
+    result = await asyncio.to_thread(
+        _store_dry_run, base_dir, current_files, UpdatePlan, {"changes": changes}, document
+    )
+    result["conflicts"] = conflicts
+    result["shards"] = shards
+
+    return result
+
+
+async def _run_map_reduce(base_dir, current_files, new_document, use_cache, document=None):
+
+    async def generate(document):
+        response_model, payload, _ = await request_plan([], document, use_cache)
+
+        if response_model is not InitialGeneration:
+            # Nothing to generate from this batch (e.g. a preamble)
+            return None
+
+        return payload
+
+    merged, batches = await run_map_reduce(new_document, generate)
+
+    if not merged["features"]:
+        raise SyncError("No features generated from the document")
+
+    result = await asyncio.to_thread(
+        _store_dry_run, base_dir, current_files, InitialGeneration, merged, document
+    )
+    result["batches"] = batches
+
+    return result
@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# ============================================================
+# Disk text cache
+#
+# One UTF-8 file per key (a hex digest), fanned out by its first
+# two characters:
+#
+#   <directory>/ab/cdef....txt
+#
+# Files are written to a temporary name and renamed into place, so
+# concurrent writers of the same key never leave a partial file.
+# Past max_bytes of cached text the least recently used files are
+# removed (0 = no limit). Recency is tracked in memory; after a
+# restart, the oldest files go first.
+# ============================================================
+
+SUFFIX = ".txt"
+
+
+class TextFileCache:
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recent first
+        self._bytes = 0
+
+        self._load()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:] + SUFFIX)
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+
+        found = []
+
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+
+            for item in os.scandir(prefix.path):
+                if not item.name.endswith(SUFFIX):
+                    continue
+
+                stat = item.stat()
+                found.append((stat.st_mtime, prefix.name + item.name[:-len(SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+
+    def _remove(self, key: str):
+        self._bytes -= self._entries.pop(key, 0)
+
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+        return text
+
+    def put(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.stored += 1
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+
+            while self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
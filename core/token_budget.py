@@ -0,0 +1,22 @@
+import json
+
+
+# ============================================================
+# Local token estimates
+#
+# A chars-per-token heuristic is close enough for budgeting
+# prompts and rate limits without a tokenizer dependency.
+# ============================================================
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(value) -> int:
+    """
+    Estimated tokens of a string, or of any other value serialized
+    as JSON the way it is sent to the model.
+    """
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+
+    return max(1, len(value) // CHARS_PER_TOKEN)
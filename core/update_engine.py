@@ -1,237 +1,284 @@
 import os
-import shutil
-from datetime import datetime
-from core import config
+from core.suite_index import get_suite_index
+from core.atomic_writer import write_files_atomic
+from core.history import get_history_store
+
+
+STEP_PREFIXES = ("Given", "When", "Then", "And", "But")
 
 
 # ============================================================
 # Helpers
 # ============================================================
 
-def _backup_file(path):
-    if not os.path.exists(path):
-        return
-
-    backup_dir = os.path.join(os.path.dirname(path), "_history")
-    os.makedirs(backup_dir, exist_ok=True)
-
-    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    backup_path = os.path.join(
-        backup_dir,
-        f"{os.path.basename(path)}.{timestamp}.bak"
-    )
-
-    shutil.copy2(path, backup_path)
-
-
 def read_all_features_map(base_dir: str):
-    files = {}
+    # Served from the shared suite index: only changed files are re-read
+    return get_suite_index(base_dir).read_map()
 
-    for root, _, file_list in os.walk(base_dir):
-        for file in file_list:
-            if file.endswith(".feature"):
-                path = os.path.join(root, file)
-                with open(path, "r", encoding="utf-8") as f:
-                    files[path] = f.read()
 
-    return files
+def build_feature_path(base: str, screen: str, feature: str) -> str:
+    screen_dir = os.path.join(base, screen)
+    filename = f"{feature.lower().replace(' ', '_')}.feature"
+    return os.path.abspath(os.path.join(screen_dir, filename))
 
 
 # ============================================================
-# Core Engine
+# File patch
 # ============================================================
 
-def apply_update_plan(update_plan: dict, simulate: bool = False):
+class FilePatch:
+    """
+    Pending edits for one feature file.
+
+    Original lines are never mutated: replacements are recorded by
+    line index and new scenarios are appended to a tail, so the
+    scenario/step offset table built from the parsed AST stays valid
+    for every change of the plan and the file is rendered in one pass.
+    Indices >= len(lines) address the appended tail.
+    """
+
+    def __init__(self, path: str, lines: list, parsed=None):
+        self.path = path
+        self.lines = lines
+        self.replaced = {}
+        self.appended = []
+        self.scenarios = {}  # scenario name -> step line indices
+
+        if parsed is not None:
+            for scenario in parsed.scenarios:
+                self.scenarios.setdefault(
+                    scenario.name, [step.line for step in scenario.steps]
+                )
+
+    def get_line(self, idx: int) -> str:
+        if idx >= len(self.lines):
+            return self.appended[idx - len(self.lines)]
+        return self.replaced.get(idx, self.lines[idx])
+
+    def set_line(self, idx: int, value: str):
+        if idx >= len(self.lines):
+            self.appended[idx - len(self.lines)] = value
+        else:
+            self.replaced[idx] = value
+
+    def append(self, line: str) -> int:
+        self.appended.append(line)
+        return len(self.lines) + len(self.appended) - 1
+
+    def append_scenario(self, name: str, steps: list):
+        self.append(f"  Scenario: {name}\n")
+        self.scenarios[name] = [self.append(f"    {step}\n") for step in steps]
+        self.append("\n")
+
+    def render(self) -> str:
+        replaced = self.replaced
+        return "".join(
+            [replaced.get(i, line) for i, line in enumerate(self.lines)]
+            + self.appended
+        )
+
+
+class PlanResult:
+
+    def __init__(self, original: dict, files: dict, changed: list,
+                 applied: list, skipped: list):
+        self.original = original  # path -> content read from disk
+        self.files = files  # path -> rendered content, every suite file
+        self.changed = changed  # paths whose content differs from disk
+        self.applied = applied
+        self.skipped = skipped
 
-    print("\n==============================")
-    print("ENTER apply_update_plan")
-    print("==============================")
 
-    if "changes" not in update_plan:
-        raise ValueError("Invalid UpdatePlan: missing changes")
+# ============================================================
+# Plan compiler
+# ============================================================
 
-    base = config.BASE_FEATURES_DIR
-    in_memory_files = {}
+def _group_changes_by_file(base: str, changes: list) -> dict:
+    """
+    {path: [(position_in_plan, change), ...]} keeping plan order per file.
+    """
+    groups = {}
 
-    # -------------------------------------------------
-    # 1️⃣ Load existing feature files
-    # -------------------------------------------------
-    if os.path.exists(base):
-        for root, _, files in os.walk(base):
-            for file in files:
-                if file.endswith(".feature"):
-                    full_path = os.path.abspath(os.path.join(root, file))
-                    with open(full_path, "r", encoding="utf-8") as f:
-                        in_memory_files[full_path] = f.readlines()
-
-    print("Loaded files:")
-    for k in in_memory_files.keys():
-        print("  ", k)
+    for position, change in enumerate(changes):
+        path = build_feature_path(base, change["screen"], change["feature"])
+        groups.setdefault(path, []).append((position, change))
 
-    # -------------------------------------------------
-    # 2️⃣ Helper to build feature path
-    # -------------------------------------------------
-    def build_feature_path(screen, feature):
-        screen_dir = os.path.join(base, screen)
-        filename = f"{feature.lower().replace(' ', '_')}.feature"
-        return os.path.abspath(os.path.join(screen_dir, filename))
+    return groups
 
-    # -------------------------------------------------
-    # 3️⃣ Apply changes
-    # -------------------------------------------------
-    for change in update_plan.get("changes", []):
 
-        print("\nProcessing change:", change)
+def _skip(position: int, change: dict, reason: str) -> dict:
+    print(f"⚠️ Skipping change #{position} ({change.get('action')}): {reason}")
+    return {
+        "index": position,
+        "action": change.get("action"),
+        "screen": change.get("screen"),
+        "feature": change.get("feature"),
+        "scenario": change.get("scenario"),
+        "reason": reason
+    }
 
-        screen = change["screen"]
-        feature = change["feature"]
-        action = change["action"]
 
-        feature_path = build_feature_path(screen, feature)
+def _create_feature(patch: FilePatch, change: dict):
+    patch.append(f"Feature: {change['feature']}\n")
+    patch.append("\n")
 
-        # =====================================================
-        # CREATE FEATURE (NO PRIOR VALIDATION)
-        # =====================================================
-        if action == "create_feature":
+    scenario = change.get("scenario")
+    new_value = change.get("new_value")
 
-            if feature_path not in in_memory_files:
-                print("Creating feature:", feature_path)
+    if scenario and new_value:
+        steps = [s.strip() for s in new_value.split("\n") if s.strip()]
+        patch.append_scenario(scenario, steps)
 
-                os.makedirs(os.path.dirname(feature_path), exist_ok=True)
 
-                lines = [
-                    f"Feature: {feature}\n",
-                    "\n"
-                ]
+def _create_scenario(patch: FilePatch, change: dict):
+    scenario = change.get("scenario")
+    new_value = change.get("new_value")
 
-                scenario = change.get("scenario")
-                new_value = change.get("new_value")
+    if not scenario or not new_value:
+        return "create_scenario requires scenario and new_value"
 
-                if scenario and new_value:
-                    print("Adding initial scenario:", scenario)
+    if scenario.strip() in patch.scenarios:
+        return "scenario already exists"
 
-                    lines.append(f"  Scenario: {scenario}\n")
+    steps = [
+        s.strip() for s in new_value.split("\n")
+        if s.strip().startswith(STEP_PREFIXES)
+    ]
+    patch.append_scenario(scenario.strip(), steps)
 
-                    for step in new_value.split("\n"):
-                        step = step.strip()
-                        if step:
-                            lines.append(f"    {step}\n")
 
-                    lines.append("\n")
+def _update_step(patch: FilePatch, change: dict):
+    scenario = (change.get("scenario") or "").strip()
+    step_index = change.get("step_index")
+    old_value = change.get("old_value")
+    new_value = change.get("new_value")
 
-                in_memory_files[feature_path] = lines
+    step_lines = patch.scenarios.get(scenario)
 
-            continue  # 🔥 critical
+    if step_lines is None:
+        return "scenario not found"
 
-        # =====================================================
-        # VALIDATE FILE EXISTS FOR OTHER ACTIONS
-        # =====================================================
-        if feature_path not in in_memory_files:
-            print("⚠️ Feature file not found:", feature_path)
-            continue
+    # Primary strategy: index
+    if step_index is not None and 0 <= step_index < len(step_lines):
+        patch.set_line(step_lines[step_index], "    " + new_value + "\n")
+        return None
 
-        lines = in_memory_files[feature_path]
+    # Fallback strategy: match old_value
+    if old_value and old_value.strip():
+        for idx in step_lines:
+            line = patch.get_line(idx)
+            if old_value.strip() in line:
+                patch.set_line(idx, line.replace(old_value.strip(), new_value.strip()))
+                return None
 
-        # =====================================================
-        # CREATE SCENARIO
-        # =====================================================
-        if action == "create_scenario":
+    return "step not found by step_index or old_value"
 
-            scenario = change.get("scenario")
-            new_value = change.get("new_value")
 
-            if scenario and new_value:
+def execute_update_plan(update_plan: dict, base_dir: str) -> PlanResult:
+    """
+    Compile the plan per file of the suite in base_dir and apply every
+    edit of a file in a single pass over its lines.
+    """
+    if "changes" not in update_plan:
+        raise ValueError("Invalid UpdatePlan: missing changes")
 
-                print("Adding scenario:", scenario)
+    base = base_dir
+    entries = get_suite_index(base).refresh()
 
-                lines.append(f"  Scenario: {scenario}\n")
+    patches = {}
+    applied = []
+    skipped = []
 
-                for step in new_value.split("\n"):
-                    step = step.strip()
-                    if not step:
-                        continue
+    groups = _group_changes_by_file(base, update_plan.get("changes", []))
 
-                    if step.startswith(("Given", "When", "Then", "And", "But")):
-                        lines.append(f"    {step}\n")
+    for path, changes in groups.items():
 
-                lines.append("\n")
+        entry = entries.get(path)
+        patch = (
+            FilePatch(path, entry.text.splitlines(keepends=True), entry.parsed)
+            if entry is not None else None
+        )
 
-        # =====================================================
-        # UPDATE STEP
-        # =====================================================
-        elif action == "update_step":
+        for position, change in changes:
 
-            scenario_name = change.get("scenario")
-            step_index = change.get("step_index")
-            old_value = change.get("old_value")
-            new_value = change.get("new_value")
+            action = change["action"]
 
-            print("Updating scenario:", scenario_name)
+            if action == "create_feature":
+                if patch is not None:
+                    skipped.append(_skip(position, change, "feature already exists"))
+                    continue
 
-            # Find scenario start
-            scenario_start = None
-            for idx, line in enumerate(lines):
-                if line.strip().startswith("Scenario:") and scenario_name in line:
-                    scenario_start = idx
-                    break
+                patch = FilePatch(path, [])
+                _create_feature(patch, change)
+                applied.append(position)
+                continue
 
-            if scenario_start is None:
-                print("⚠️ Scenario not found:", scenario_name)
+            if patch is None:
+                skipped.append(_skip(position, change, "feature file not found"))
                 continue
 
-            # Collect scenario steps
-            scenario_indices = []
-            for i in range(scenario_start + 1, len(lines)):
-                if lines[i].strip().startswith("Scenario:"):
-                    break
-                if lines[i].strip().startswith(("Given", "When", "Then", "And", "But")):
-                    scenario_indices.append(i)
-
-            print("Scenario indices:", scenario_indices)
-            print("Requested step_index:", step_index)
-
-            # Primary strategy: index
-            if step_index is not None and step_index < len(scenario_indices):
-                target_line_index = scenario_indices[step_index]
-                print("BEFORE:", lines[target_line_index].strip())
-                lines[target_line_index] = "    " + new_value + "\n"
-                print("AFTER :", lines[target_line_index].strip())
-
-            # Fallback strategy: match old_value
+            if action == "create_scenario":
+                reason = _create_scenario(patch, change)
+            elif action == "update_step":
+                reason = _update_step(patch, change)
             else:
-                print("⚠️ step_index invalid, fallback to old_value match")
+                reason = f"{action} is not supported by the patch engine"
+
+            if reason:
+                skipped.append(_skip(position, change, reason))
+            else:
+                applied.append(position)
+
+        if patch is not None:
+            patches[path] = patch
 
-                replaced = False
-                for i in scenario_indices:
-                    if old_value and old_value.strip() in lines[i]:
-                        print("BEFORE:", lines[i].strip())
-                        lines[i] = lines[i].replace(old_value.strip(), new_value.strip())
-                        print("AFTER :", lines[i].strip())
-                        replaced = True
-                        break
+    original = {path: entry.text for path, entry in entries.items()}
+    files = dict(original)
+    changed = []
+
+    for path, patch in patches.items():
+        content = patch.render()
+
+        if path not in files or files[path] != content:
+            changed.append(path)
+
+        files[path] = content
+
+    print(
+        f"Plan compiled: {len(applied)} applied, {len(skipped)} skipped, "
+        f"{len(changed)} files changed"
+    )
 
-                if not replaced:
-                    print("⚠️ Could not update step via fallback")
+    return PlanResult(original, files, changed, sorted(applied), skipped)
+
+
+# ============================================================
+# Core Engine
+# ============================================================
+
+def apply_update_plan(update_plan: dict, simulate: bool, base_dir: str):
+
+    result = execute_update_plan(update_plan, base_dir)
 
     # -------------------------------------------------
-    # 4️⃣ SIMULATION MODE
+    # SIMULATION MODE
     # -------------------------------------------------
     if simulate:
-        print("Returning simulated files")
-        return {
-            path: "".join(lines)
-            for path, lines in in_memory_files.items()
-        }
+        return result.files
 
     # -------------------------------------------------
-    # 5️⃣ APPLY REAL
+    # APPLY REAL
     # -------------------------------------------------
-    print("Writing to disk")
+    # Only the files the plan actually changed are written
+    print(f"Writing {len(result.changed)} changed files to disk")
+
+    changed = {path: result.files[path] for path in result.changed}
+
+    write_files_atomic(changed)
 
-    for path, lines in in_memory_files.items():
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        _backup_file(path)
-        with open(path, "w", encoding="utf-8") as f:
-            f.writelines(lines)
+    if changed:
+        get_history_store(base_dir).record(
+            result.original, changed, "apply_update_plan"
+        )
 
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,151 @@
+import os
+import hashlib
+import tempfile
+import threading
+from core import config
+from core.document_reader import extract_document
+from .text_cache import TextFileCache
+
+
+# ============================================================
+# Uploads
+#
+# An upload is copied in UPLOAD_CHUNK_BYTES chunks to a spool file
+# that keeps the original extension, hashing it on the way and
+# failing as soon as it exceeds QA_UPLOAD_MAX_BYTES. The spool file
+# is removed by discard(), whatever happened in between.
+#
+# Extracted text is cached by content hash (plus extension and page
+# selection), so re-submitting the same document skips parsing:
+#
+#   <CACHE_DIR>/extracted/ab/cdef....txt   (QA_EXTRACTED_TEXT_CACHE_MAX_BYTES)
+# ============================================================
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+TEXT_CACHE_DIRNAME = "extracted"
+
+# Bump when extraction output changes, to retire cached texts
+EXTRACTOR_VERSION = 2
+
+
+class UploadTooLargeError(Exception):
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class SpooledUpload:
+
+    def __init__(self, path: str, ext: str, sha256: str, size: int):
+        self.path = path
+        self.ext = ext
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(file, max_bytes: int = None, directory: str = None) -> SpooledUpload:
+    """
+    Copy an UploadFile to a spool file (in directory, default the
+    system temp dir). Raises UploadTooLargeError.
+    """
+    max_bytes = config.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+
+    if max_bytes and file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    fd, path = tempfile.mkstemp(suffix=ext, dir=directory)
+
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+
+                digest.update(chunk)
+                spool.write(chunk)
+
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, ext, digest.hexdigest(), size)
+
+
+def local_upload(path: str) -> SpooledUpload:
+    """
+    Describe a file already on disk like an upload. Blocking; the
+    file is the caller's and must not be discarded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return SpooledUpload(path, os.path.splitext(path)[1].lower(), digest.hexdigest(), size)
+
+
+# ============================================================
+# Extracted text cache
+# ============================================================
+
+def text_cache_key(upload: SpooledUpload, pages: str = None) -> str:
+    # The page limit decides whether a PDF is extracted at all
+    return hashlib.sha256(
+        f"{EXTRACTOR_VERSION}\0{upload.ext}\0{upload.sha256}\0{pages or ''}"
+        f"\0{config.PDF_MAX_PAGES}".encode("utf-8")
+    ).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> TextFileCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = TextFileCache(
+                os.path.join(config.CACHE_DIR, TEXT_CACHE_DIRNAME),
+                config.EXTRACTED_TEXT_CACHE_MAX_BYTES
+            )
+
+    return _cache
+
+
+def extract_upload(upload: SpooledUpload, pages: str = None) -> str:
+    """
+    Text of a spooled upload, from the cache when the same content
+    (page selection and page limit) was extracted before. Blocking.
+    """
+    cache = get_text_cache()
+    key = text_cache_key(upload, pages)
+
+    text = cache.get(key)
+    if text is None:
+        text = extract_document(upload.path, pages)
+        cache.put(key, text)
+
+    return text
@@ -3,6 +3,7 @@
 // ==========================================
 
 let proposedData = null;
+let proposedPlanId = null;
 let currentStructure = {};
 let proposedDiffMap = {};   // 🔥 ahora es MAPA
 
@@ -95,6 +96,7 @@ async function generate() {
         const data = await response.json();
 
         proposedData = data.result;
+        proposedPlanId = data.plan_id || null;
         proposedDiffMap = data.diff || {};   // 🔥 ahora mapa
 
         renderProposed();
@@ -133,13 +135,21 @@ async function applyChanges() {
 
     try {
 
-        await fetch("/apply-proposed", {
+        const response = await fetch("/apply-proposed", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(proposedData)
+            body: JSON.stringify({ ...proposedData, plan_id: proposedPlanId })
         });
 
+        if (response.status === 409 || response.status === 410) {
+            const data = await response.json();
+            alert(data.error + (data.conflicts ? "\n" + data.conflicts.join("\n") : ""));
+            hideLoader();
+            return;
+        }
+
         proposedData = null;
+        proposedPlanId = null;
         proposedDiffMap = {};
 
         updateActionButtons();